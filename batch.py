@@ -0,0 +1,93 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+
+DEFAULT_CHUNK_SIZE = 1024
+
+
+@dataclass
+class RecordBatch:
+    columns: Dict[str, List[Any]]
+    length: int
+    lazy: List[str] = field(default_factory=list)
+
+    def column(self, name: str) -> List[Any]:
+        return self.columns[name]
+
+    def materialize(self) -> 'RecordBatch':
+        # Lazy text columns hold the undecoded bytes of the source file
+        if not self.lazy:
+            return self
+
+        columns = dict(self.columns)
+        for name in self.lazy:
+            columns[name] = [value.decode('utf-8')
+                             if isinstance(value, bytes) else value
+                             for value in columns[name]]
+
+        return RecordBatch(columns=columns, length=self.length)
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        names = list(self.columns)
+        for values in zip(*(self.columns[name] for name in names)):
+            yield dict(zip(names, values))
+
+    @classmethod
+    def from_records(cls, records: Sequence[Any],
+                     names: List[str]) -> 'RecordBatch':
+        return cls(
+            columns={name: [getattr(record, name) for record in records]
+                     for name in names},
+            length=len(records)
+        )
+
+
+class BatchBuilder:
+    def __init__(self, names: List[str], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 lazy: Optional[List[str]] = None):
+        self.names = names
+        self.chunk_size = chunk_size
+        self.lazy = lazy or []
+        self._columns = [[] for _ in names]
+
+        return
+
+    def append(self, values: Sequence[Any]) -> Optional[RecordBatch]:
+        for column, value in zip(self._columns, values):
+            column.append(value)
+
+        if len(self._columns[0]) >= self.chunk_size:
+            return self.flush()
+
+        return None
+
+    def flush(self) -> Optional[RecordBatch]:
+        length = len(self._columns[0]) if self._columns else 0
+        if length == 0:
+            return None
+
+        batch = RecordBatch(columns=dict(zip(self.names, self._columns)),
+                            length=length, lazy=self.lazy)
+        self._columns = [[] for _ in self.names]
+
+        return batch
+
+
+def chunk_columns(columns: Dict[str, List[Any]],
+                  chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  lazy: Optional[List[str]] = None) -> Iterator[RecordBatch]:
+    length = len(next(iter(columns.values()), []))
+
+    for start in range(0, length, chunk_size):
+        end = min(start + chunk_size, length)
+        yield RecordBatch(
+            columns={name: values[start:end] for name, values in columns.items()},
+            length=end - start,
+            lazy=lazy or []
+        )
+
+
+def chunk_records(records: Sequence[Any], names: List[str],
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[RecordBatch]:
+    for start in range(0, len(records), chunk_size):
+        yield RecordBatch.from_records(records[start:start + chunk_size], names)
@@ -0,0 +1,106 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+
+INSERT = 'insert'
+UPDATE = 'update'
+
+
+@dataclass
+class MovieChange:
+    op: str
+    key: str
+    title: str
+    year: int
+    fields: Dict[str, Tuple[Any, Any]] = field(default_factory=dict)
+
+
+class ChangeLog:
+    def __init__(self, enabled: bool = False):
+        # One coalesced change per movie, in the order movies first changed.
+        # The changes are only kept when the log is enabled, otherwise only
+        # the keys of the changed movies are, to count them.
+        self.enabled = enabled
+        self._changes: Dict[str, MovieChange] = {}
+        self._changed: Set[str] = set()
+        self._listeners: List[Callable[[str], None]] = []
+        self._field_listeners: List[Callable[[str, Any, Any], None]] = []
+
+        return
+
+    def enable(self) -> None:
+        self.enabled = True
+
+        return
+
+    def subscribe(self, listener: Callable[[str], None]) -> None:
+        # Listeners get the key of every movie changed, also after a drain
+        self._listeners.append(listener)
+
+        return
+
+    def subscribe_fields(self, listener: Callable[[str, Any, Any], None]) -> None:
+        # Field listeners get the name, old and new value of every changed
+        # field
+        self._field_listeners.append(listener)
+
+        return
+
+    def record_insert(self, key: str, year: int) -> None:
+        if not self.enabled:
+            self._changed.add(key)
+            return
+
+        self._changes[key] = MovieChange(op=INSERT, key=key, title="", year=year)
+
+        return
+
+    def record_update(self, key: str, title: str, year: int, name: str,
+                      old: Any, new: Any) -> None:
+        if old == new:
+            return
+
+        for listener in self._listeners:
+            listener(key)
+        for field_listener in self._field_listeners:
+            field_listener(name, old, new)
+
+        if not self.enabled:
+            self._changed.add(key)
+            return
+
+        change = self._changes.get(key)
+        if change is None:
+            change = MovieChange(op=UPDATE, key=key, title=title, year=year)
+            self._changes[key] = change
+
+        if name in change.fields:
+            old = change.fields[name][0]
+
+        if old == new and change.op == UPDATE:
+            del change.fields[name]
+            if not change.fields:
+                del self._changes[key]
+        else:
+            change.fields[name] = (old, new)
+
+        if name == 'title':
+            change.title = new
+
+        return
+
+    def changes(self) -> List[MovieChange]:
+        return list(self._changes.values())
+
+    def keys(self) -> List[str]:
+        return list(self._changes) if self.enabled else list(self._changed)
+
+    def drain(self) -> List[MovieChange]:
+        changes = self.changes()
+        self._changes = {}
+        self._changed = set()
+
+        return changes
+
+    def __len__(self) -> int:
+        return len(self._changes) if self.enabled else len(self._changed)
@@ -0,0 +1,59 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[[Dict[str, Any]], Any]
+    depends_on: List[str] = field(default_factory=list)
+
+
+def validate_stages(stages: List[Stage]) -> None:
+    names = {stage.name for stage in stages}
+    if len(names) != len(stages):
+        raise ValueError("Duplicated stage names")
+
+    for stage in stages:
+        for dependency in stage.depends_on:
+            if dependency not in names:
+                raise ValueError(
+                    f"Stage {stage.name} depends on unknown stage {dependency}")
+
+    # Kahn's algorithm, only to reject cycles before anything is executed
+    remaining = {stage.name: set(stage.depends_on) for stage in stages}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(
+                f"Cycle between stages: {', '.join(sorted(remaining))}")
+
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+    return
+
+
+def run_stages(stages: List[Stage], max_workers: int = 1) -> Dict[str, Any]:
+    validate_stages(stages)
+
+    pending = {stage.name: stage for stage in stages}
+    results: Dict[str, Any] = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        running = {}
+
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(dep in results for dep in stage.depends_on):
+                    running[executor.submit(stage.func, results)] = name
+                    del pending[name]
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                results[running.pop(future)] = future.result()
+
+    return results
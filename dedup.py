@@ -0,0 +1,274 @@
+import json
+import math
+import time
+from hashlib import blake2b
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from batch import RecordBatch
+from models import movie_key
+
+
+def row_fingerprints(provider: str,
+                     columns: Sequence[List[Any]]) -> List[bytes]:
+    # Text is hashed as the raw bytes, so the csv and mmap readers give the
+    # same fingerprint for the same row. Values are encoded a column at a
+    # time and the rows joined in C.
+    encoded = [[value if isinstance(value, bytes) else str(value).encode('utf-8')
+                for value in column] for column in columns]
+    prefix = provider.encode('utf-8') + b'\x1f'
+
+    return [blake2b(prefix + row, digest_size=16).digest()
+            for row in map(b'\x1f'.join, zip(*encoded))]
+
+
+def _fingerprint_hashes(fingerprints: List[bytes]) -> np.ndarray:
+    # The two 64 bit halves of every fingerprint, one row per fingerprint
+    return np.frombuffer(b''.join(fingerprints), dtype='>u8') \
+        .astype(np.uint64).reshape(len(fingerprints), 2)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        if capacity <= 0:
+            raise ValueError("Bloom filter capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("Bloom filter error rate must be between 0 and 1")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(math.ceil(-capacity * math.log(error_rate)
+                                  / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+        return
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        positions = self._positions(hashes)
+        masks = np.left_shift(1, positions & np.uint64(7)).astype(np.uint8)
+
+        return ((self.bits[positions >> np.uint64(3)] & masks) != 0).all(axis=1)
+
+    def add(self, hashes: np.ndarray) -> None:
+        positions = self._positions(hashes).ravel()
+        masks = np.left_shift(1, positions & np.uint64(7)).astype(np.uint8)
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), masks)
+
+        self.count += len(hashes)
+
+        return
+
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'capacity': self.capacity, 'error_rate': self.error_rate,
+                'count': self.count, 'bits': self.bits.tobytes().hex()}
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> 'BloomFilter':
+        bloom = cls(raw['capacity'], raw['error_rate'])
+        bloom.count = raw['count']
+        bloom.bits = np.frombuffer(bytes.fromhex(raw['bits']),
+                                   dtype=np.uint8).copy()
+
+        return bloom
+
+    def _positions(self, hashes: np.ndarray) -> np.ndarray:
+        # Double hashing: the k positions of a fingerprint come from its two
+        # halves, one row of positions per fingerprint
+        size = np.uint64(self.size)
+        first = hashes[:, 0] % size
+        step = (hashes[:, 1] | np.uint64(1)) % size
+        rounds = np.arange(self.hashes, dtype=np.uint64)
+
+        return (first[:, None] + step[:, None] * rounds) % size
+
+
+class FilteredBatch(NamedTuple):
+    # The rows of a batch not ingested before, with their fingerprints and,
+    # in exact mode, the fingerprints of their provider and movie key
+    batch: RecordBatch
+    fingerprints: List[bytes]
+    keys: List[bytes]
+
+
+class RowFilter:
+    def __init__(self, mode: str = 'exact', error_rate: float = 0.001,
+                 capacity: int = 100000):
+        if mode not in ('bloom', 'exact'):
+            raise ValueError(f"Unknown dedup mode: {mode}")
+
+        # exact keeps the fingerprint of the last row merged for every
+        # provider and movie, and only skips a row that repeats it, so the
+        # catalog ends up as without dedup. bloom keeps every row fingerprint
+        # ever merged: it can drop a new row with probability error_rate, and
+        # a row sent again after a correction of the movie.
+        self.mode = mode
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.blooms: List[BloomFilter] = []
+        self.latest: Dict[bytes, bytes] = {}
+
+        if mode == 'bloom':
+            # Each bloom added when the last one is full has double the
+            # capacity and half the error rate, so the total stays close to
+            # error_rate as the filter grows
+            self.blooms.append(BloomFilter(capacity, error_rate / 2))
+
+        self.rows = 0
+        self.skipped = 0
+        self.filter_time = 0.0
+        self.merged_rows = 0
+        self.merge_time = 0.0
+
+        return
+
+    def new_rows(self, fingerprints: List[bytes],
+                 keys: Sequence[bytes] = ()) -> List[int]:
+        # Rows not merged before. The fingerprints are only added once the
+        # rows are merged.
+        if self.mode == 'exact':
+            # A row is new unless it repeats the row before it for its movie,
+            # in the list or merged last
+            latest: Dict[bytes, bytes] = {}
+            new = []
+            for row, (key, fingerprint) in enumerate(zip(keys, fingerprints)):
+                if latest.get(key, self.latest.get(key)) != fingerprint:
+                    new.append(row)
+                latest[key] = fingerprint
+
+            return new
+
+        # A row repeated in the list is only kept the first time
+        first_rows: Dict[bytes, int] = {}
+        for row, fingerprint in enumerate(fingerprints):
+            first_rows.setdefault(fingerprint, row)
+
+        if not first_rows:
+            return []
+
+        # The whole batch is looked up in the blooms at once with NumPy
+        hashes = _fingerprint_hashes(list(first_rows))
+        seen = np.zeros(len(hashes), dtype=bool)
+        for bloom in self.blooms:
+            seen |= bloom.contains(hashes)
+
+        return [row for row, was_seen in zip(first_rows.values(), seen)
+                if not was_seen]
+
+    def add(self, fingerprints: List[bytes],
+            keys: Sequence[bytes] = ()) -> None:
+        if self.mode == 'exact':
+            self.latest.update(zip(keys, fingerprints))
+            return
+
+        if not fingerprints:
+            return
+
+        added = _fingerprint_hashes(fingerprints)
+        while len(added):
+            last = self.blooms[-1]
+            if last.is_full():
+                self.blooms.append(BloomFilter(last.capacity * 2,
+                                               last.error_rate / 2))
+                continue
+
+            room = last.capacity - last.count
+            last.add(added[:room])
+            added = added[room:]
+
+        return
+
+    def filter_batch(self, batch: RecordBatch, provider: str,
+                     key_columns: Tuple[str, str]) -> FilteredBatch:
+        # key_columns are the title and year columns of the batch
+        started = time.perf_counter()
+
+        fingerprints = row_fingerprints(
+            provider, [batch.columns[name] for name in sorted(batch.columns)])
+        keys = self._movie_keys(batch, provider, key_columns) \
+            if self.mode == 'exact' else []
+        kept = self.new_rows(fingerprints, keys)
+
+        self.rows += batch.length
+        self.skipped += batch.length - len(kept)
+
+        if len(kept) < batch.length:
+            batch = RecordBatch(
+                columns={name: [values[row] for row in kept]
+                         for name, values in batch.columns.items()},
+                length=len(kept), lazy=batch.lazy)
+
+        self.filter_time += time.perf_counter() - started
+
+        return FilteredBatch(batch, [fingerprints[row] for row in kept],
+                             [keys[row] for row in kept] if keys else [])
+
+    def record_merge(self, filtered: FilteredBatch, seconds: float) -> None:
+        # Called once the rows are merged: a batch that fails to merge is
+        # not marked as ingested and its rows are merged by the next try
+        self.add(filtered.fingerprints, filtered.keys)
+        self.merged_rows += filtered.batch.length
+        self.merge_time += seconds
+
+        return
+
+    def skipped_fraction(self) -> float:
+        return self.skipped / self.rows if self.rows else 0.0
+
+    def time_saved(self) -> float:
+        # Skipped rows would have cost the average merge time of a row, less
+        # the time spent fingerprinting every row. The merge times are kept
+        # across runs, so a run that skips every row still has an estimate.
+        if not self.merged_rows:
+            return -self.filter_time
+
+        return self.skipped * self.merge_time / self.merged_rows \
+            - self.filter_time
+
+    def save(self, path: str) -> None:
+        with open(path, 'w') as fp:
+            json.dump({
+                'mode': self.mode,
+                'error_rate': self.error_rate,
+                'capacity': self.capacity,
+                'merged_rows': self.merged_rows,
+                'merge_time': self.merge_time,
+                'blooms': [bloom.to_dict() for bloom in self.blooms],
+                'latest': {key.hex(): fingerprint.hex()
+                           for key, fingerprint in self.latest.items()}
+            }, fp)
+
+        return
+
+    @classmethod
+    def load(cls, path: str) -> 'RowFilter':
+        with open(path, 'r') as fp:
+            raw = json.load(fp)
+
+        row_filter = cls(raw['mode'], raw['error_rate'], raw['capacity'])
+        row_filter.merged_rows = raw['merged_rows']
+        row_filter.merge_time = raw['merge_time']
+        row_filter.blooms = [BloomFilter.from_dict(bloom)
+                             for bloom in raw['blooms']]
+        row_filter.latest = {bytes.fromhex(key): bytes.fromhex(fingerprint)
+                             for key, fingerprint
+                             in raw.get('latest', {}).items()}
+
+        return row_filter
+
+    def _movie_keys(self, batch: RecordBatch, provider: str,
+                    key_columns: Tuple[str, str]) -> List[bytes]:
+        # Same key as the repository, so two spellings of a title that merge
+        # into one movie share the last row
+        title_column, year_column = key_columns
+        titles = [title.decode('utf-8') if isinstance(title, bytes) else title
+                  for title in batch.column(title_column)]
+
+        return row_fingerprints(provider, [[
+            movie_key(title, year)
+            for title, year in zip(titles, batch.column(year_column))]])
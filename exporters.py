@@ -0,0 +1,66 @@
+import json
+from pathlib import Path
+from typing import List
+
+from changes import MovieChange
+
+
+def write_delta_jsonl(changes: List[MovieChange], path: str) -> int:
+    with open(path, 'w') as fp:
+        for change in changes:
+            fp.write(json.dumps({
+                'op': change.op,
+                'key': change.key,
+                'title': change.title,
+                'year': change.year,
+                'fields': {name: {'old': old, 'new': new}
+                           for name, (old, new) in change.fields.items()}
+            }) + "\n")
+
+    return len(changes)
+
+
+def write_delta_parquet(changes: List[MovieChange], path: str) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError(
+            "pyarrow is needed to write Parquet deltas: pip3 install pyarrow"
+        ) from error
+
+    # One row per changed field. Field types differ, so old and new values
+    # are stored JSON encoded.
+    rows = [
+        {
+            'op': change.op,
+            'key': change.key,
+            'title': change.title,
+            'year': change.year,
+            'field': name,
+            'old': json.dumps(old),
+            'new': json.dumps(new)
+        }
+        for change in changes
+        for name, (old, new) in change.fields.items()
+    ]
+    schema = pa.schema([
+        ('op', pa.string()),
+        ('key', pa.string()),
+        ('title', pa.string()),
+        ('year', pa.int32()),
+        ('field', pa.string()),
+        ('old', pa.string()),
+        ('new', pa.string())
+    ])
+
+    pq.write_table(pa.Table.from_pylist(rows, schema=schema), path)
+
+    return len(changes)
+
+
+def write_delta(changes: List[MovieChange], path: str) -> int:
+    if Path(path).suffix == '.parquet':
+        return write_delta_parquet(changes, path)
+
+    return write_delta_jsonl(changes, path)
@@ -1,91 +1,434 @@
+import time
+
+_START_TIME = time.perf_counter()
+
+import argparse
+import sys
 from pathlib import Path
+from typing import List, Optional
 
 from repository import MovieRepository
-from pipeline import MovieDataPipeline
-from readers.critic_agg import CriticAggReader
-from readers.audience_pulse import AudiencePulseReader
-from readers.box_office_metrics import BoxOfficeMetricsReader
 
 
-def main():
+DEFAULT_SPEC = "pipeline.json"
+DEFAULT_CATALOG = "data/catalog.json"
+
+
+def stats_file(catalog: str) -> Path:
+    return Path(catalog).with_suffix(".stats.json")
+
+
+def dedup_file(catalog: str) -> Path:
+    return Path(catalog).with_suffix(".dedup.json")
+
+
+def load_row_filter(spec, mode: Optional[str], catalog: str, resume: bool):
+    # A saved filter is only reused with the catalog it was built for, and
+    # when it was built with the same settings
+    row_filter = spec.row_filter(mode)
+    path = dedup_file(catalog)
+    if row_filter is None or not resume or not path.exists():
+        return row_filter
+
+    from dedup import RowFilter
+
+    saved = RowFilter.load(str(path))
+    if saved.mode == row_filter.mode and (
+            saved.mode == 'exact' or
+            (saved.error_rate, saved.capacity) ==
+            (row_filter.error_rate, row_filter.capacity)):
+        return saved
+
+    print(f"Dedup settings changed, {path} is built again")
+
+    return row_filter
+
+
+def load_catalog(catalog: str) -> Optional[MovieRepository]:
+    if not Path(catalog).exists():
+        print(f"No catalog found at {catalog}, run ingest first")
+        return None
+
+    return MovieRepository.load(catalog)
+
+
+def print_movie(movie) -> None:
+    print(f" {movie.title} ({movie.year})")
+    print(f"- Critic Score Percentage: {movie.critic_score_pct}% "
+          f"| Top Critic Score: {movie.top_critic_score}")
+    ratings = f"{movie.tot_audience_ratings:,}" \
+        if movie.tot_audience_ratings is not None else None
+    print(f"- Audience Average Score: {movie.audience_avg_score} "
+          f"| Ratings: {ratings}")
+
+    total_box_office = movie.get_total_box_office()
+    if total_box_office:
+        print(f"- Total Box Office: ${total_box_office:,}")
+
+    if movie.prd_budget:
+        print(f"- Budget: ${movie.prd_budget:,}")
+
+    roi = movie.get_roi()
+    print(f"- ROI: {roi:.1f}%"
+          if roi is not None
+          else "- ROI: Not available")
+
+    print()
+
+    return
+
+
+def cmd_ingest(args) -> int:
+    # Readers and the pipeline are only needed when ingesting, so they are
+    # imported here instead of at module load
+    from pipeline import MovieDataPipeline
+    from registry import load_pipeline_spec
+    from sketches import CatalogStats
+
     print(" Movie Data Pipeline - Initializing...\n")
-    
-    data_dir = Path("data")
+
+    spec = load_pipeline_spec(args.spec)
+    registry = spec.registry()
+    providers = args.providers or registry.names()
+    data_dir = Path(args.data_dir or spec.data_dir)
+    parallelism = args.parallelism or spec.parallelism
+    chunk_size = args.chunk_size or spec.chunk_size
 
     print("Setting data readers...")
+    readers = registry.build_readers(data_dir, providers)
 
-    critic_reader = CriticAggReader(f"{data_dir}/critic_aggregator.csv")
-    
-    audience_reader = AudiencePulseReader(f"{data_dir}/audience_pulse.json")
+    # A delta is only meaningful against the saved catalog, so --delta-out
+    # always merges into it
+    incremental = args.incremental or args.delta_out is not None
 
-    box_office_reader = BoxOfficeMetricsReader(
-        domestic_path=f"{data_dir}/box_office_metrics_domestic.csv",
-        international_path=f"{data_dir}/box_office_metrics_international.csv",
-        financials_path=f"{data_dir}/box_office_metrics_financials.csv"
-    )
+    # The saved stats and dedup filter describe the saved catalog, they are
+    # only reused with it
+    resume = incremental and Path(args.catalog).exists()
 
     print("Starting repository and pipeline...")
-    repository = MovieRepository()
-    pipeline = MovieDataPipeline(repository)
+    stats_path = stats_file(args.catalog)
+    if resume:
+        repository = MovieRepository.load(args.catalog, spec.merge_policy())
+    else:
+        repository = MovieRepository(spec.merge_policy())
 
-    print("Processing data from providers...\n")
+    # The changes of the run are only kept when they are written out
+    if args.delta_out:
+        repository.changes.enable()
+
+    if resume and stats_path.exists():
+        stats = CatalogStats.load(str(stats_path))
+    else:
+        stats = CatalogStats()
+        stats.add_movies(repository.search_all())
+
+    row_filter = load_row_filter(spec, args.dedup, args.catalog, resume)
 
-    readers = {
-        'critic': critic_reader,
-        'audience': audience_reader,
-        'box_office': box_office_reader
-    }
-    
+    pipeline = MovieDataPipeline(repository, registry, parallelism, chunk_size,
+                                 stats, row_filter)
+
+    print("Processing data from providers...\n")
     pipeline.run(readers)
 
+    repository.save(args.catalog)
+    stats.save(str(stats_path))
+    if row_filter is not None:
+        row_filter.save(str(dedup_file(args.catalog)))
+
     print(f"Pipeline finished with success!")
-    print(f"Total movies processed: {repository.count()}\n")
-    
-    print("=" * 80)
-    print("Movies in repository:\n")
-    
-    for movie in repository.search_all():
-        print(f" {movie.title} ({movie.year})")
-        print(f"- Critic Score Percentage: {movie.critic_score_pct}% "
-              f"| Top Critic Score: {movie.top_critic_score}")
-        print(f"- Audience Average Score: {movie.audience_avg_score} "
-              f"| Ratings: {movie.tot_audience_ratings:,}")
-
-        total_box_office = movie.get_total_box_office()
-        if total_box_office:
-            print(f"- Total Box Office: ${total_box_office:,}")
-        
-        if movie.prd_budget:
-            print(f"- Budget: ${movie.prd_budget:,}")
-        
-        print()
-
-    print("=" * 80)
-    print("- Search example: Looking for 'Inception'...\n")
-
-    inception = repository.search("Inception", 2010)
-    if inception:
-        total_box_office = inception.get_total_box_office()
-        roi = None
-        if total_box_office is not None and inception.prd_budget is not None \
-        and inception.market_spend is not None:
-            income = total_box_office - inception.prd_budget - inception.market_spend
-            expenses = inception.prd_budget + inception.market_spend
-
-            if expenses > 0:
-                roi = (income / expenses * 100)
-            else:
-                roi = 0
-
-        print(f"- Found: ${inception.prd_budget:,}" 
-              if inception.prd_budget else " Budget: Not available")
-        print(f"- World Box Office: ${inception.get_total_box_office():,}" 
-              if inception.get_total_box_office() 
-              else " Box Office: Not available")
-        print(f"- ROI: {roi:.1f}%" 
-              if roi is not None 
-              else " ROI: Not available")
+    print(f"Total movies processed: {repository.count()}")
+    print(f"Movies changed in this run: {len(repository.changes)}")
+    if row_filter is not None:
+        print(f"Duplicate rows skipped: {row_filter.skipped} of {row_filter.rows} "
+              f"({row_filter.skipped_fraction():.1%}) "
+              f"| Time saved: {row_filter.time_saved() * 1000:.1f} ms")
+    print(f"Catalog saved to {args.catalog}\n")
+
+    if args.delta_out:
+        from exporters import write_delta
+
+        written = write_delta(repository.changes.drain(), args.delta_out)
+        print(f"Delta with {written} changed movies saved to {args.delta_out}\n")
+
+    return 0
+
+
+def cmd_watch(args) -> int:
+    from pipeline import MovieDataPipeline
+    from registry import load_pipeline_spec
+    from sketches import CatalogStats
+    from watcher import DropDirectoryWatcher
+
+    spec = load_pipeline_spec(args.spec)
+    drop_dir = args.drop_dir or spec.data_dir
+    stats_path = stats_file(args.catalog)
+
+    resume = Path(args.catalog).exists()
+    if resume:
+        repository = MovieRepository.load(args.catalog, spec.merge_policy())
+    else:
+        repository = MovieRepository(spec.merge_policy())
+
+    if resume and stats_path.exists():
+        stats = CatalogStats.load(str(stats_path))
+    else:
+        stats = CatalogStats()
+        stats.add_movies(repository.search_all())
+
+    row_filter = load_row_filter(spec, args.dedup, args.catalog, resume)
+
+    pipeline = MovieDataPipeline(repository, spec.registry(), spec.parallelism,
+                                 spec.chunk_size, stats, row_filter)
+
+    def save() -> None:
+        repository.save(args.catalog)
+        stats.save(str(stats_path))
+        if row_filter is not None:
+            row_filter.save(str(dedup_file(args.catalog)))
+        repository.changes.drain()
+
+        return
+
+    # Saving writes the whole catalog, so it is done every save_interval
+    # seconds instead of after every micro-batch
+    last_save = time.monotonic()
+    unsaved = False
+
+    def on_batch(report) -> None:
+        nonlocal last_save, unsaved
+
+        print(f"Merged {report.rows} rows from {report.files} files "
+              f"in {report.duration * 1000:.1f} ms "
+              f"| Freshness lag: {report.freshness_lag:.2f} s")
+        for failed in report.failed:
+            print(f"Failed to ingest, moved to {failed.path} "
+                  f"({failed.merged_rows} rows merged before the error): "
+                  f"{failed.error}", file=sys.stderr)
+
+        unsaved = True
+        if time.monotonic() - last_save >= args.save_interval:
+            save()
+            last_save = time.monotonic()
+            unsaved = False
+
+        return
+
+    watcher = DropDirectoryWatcher(pipeline, drop_dir,
+                                   poll_interval=args.poll_interval,
+                                   max_latency=args.max_latency,
+                                   max_batch_files=args.max_batch_files,
+                                   on_batch=on_batch)
+
+    print(f"Watching {drop_dir} for provider files...")
+    try:
+        watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if unsaved:
+            save()
+
+    return 0
+
+
+def cmd_query(args) -> int:
+    repository = load_catalog(args.catalog)
+    if repository is None:
+        return 1
+
+    if args.title is None:
+        for movie in repository.search_all():
+            print_movie(movie)
+
+        return 0
+
+    if args.year is None:
+        movies = [movie for movie in repository.search_all()
+                  if movie.title.lower().strip() == args.title.lower().strip()]
+    else:
+        movie = repository.search(args.title, args.year)
+        movies = [movie] if movie else []
+
+    if not movies:
+        print(f"No movie found for '{args.title}'")
+        return 1
+
+    for movie in movies:
+        print_movie(movie)
+
+    return 0
+
+
+def cmd_top(args) -> int:
+    from registry import load_pipeline_spec
+    from scoring import ScoreWeights, ScoringEngine
+
+    repository = load_catalog(args.catalog)
+    if repository is None:
+        return 1
+
+    spec = load_pipeline_spec(args.spec)
+    engine = ScoringEngine(repository, ScoreWeights.from_dict(spec.scoring))
+    percentiles = engine.percentiles()
+
+    for position, (movie, score) in enumerate(engine.top(args.k, args.year), 1):
+        print(f"{position}. {movie.title} ({movie.year}) - Score: {score:.1f} "
+              f"| Percentile: {percentiles[movie.get_movie_key()]:.0f}")
+
+    return 0
+
+
+def cmd_stats(args) -> int:
+    # Reads the sketches saved by ingest, the catalog itself is not loaded
+    from sketches import CatalogStats
+
+    path = stats_file(args.catalog)
+    if not path.exists():
+        print(f"No statistics found at {path}, run ingest first")
+        return 1
+
+    stats = CatalogStats.load(str(path))
+
+    print(f"Rows ingested: {stats.rows}")
+    print(f"Distinct movies: ~{stats.distinct_titles()}")
+
+    for year in sorted(stats.titles_per_year):
+        print(f"- {year}: ~{stats.distinct_titles(year)} movies")
+
+    for name in sorted(stats.quantiles):
+        median = stats.quantile(name, 0.5)
+        if median is None:
+            continue
+
+        print(f"{name}: median {median:,.2f} "
+              f"| p95 {stats.quantile(name, 0.95):,.2f}")
+
+    return 0
+
+
+def cmd_export(args) -> int:
+    import csv
+    import json
+    from dataclasses import asdict, fields
+
+    from models import Movie
+
+    repository = load_catalog(args.catalog)
+    if repository is None:
+        return 1
+
+    movies = repository.search_all()
+
+    with open(args.output, 'w', newline='') as fp:
+        if args.format == 'csv':
+            writer = csv.DictWriter(
+                fp, fieldnames=[f.name for f in fields(Movie)])
+            writer.writeheader()
+            for movie in movies:
+                writer.writerow(asdict(movie))
+        else:
+            for movie in movies:
+                fp.write(json.dumps(asdict(movie)) + "\n")
+
+    print(f"Exported {len(movies)} movies to {args.output}")
+
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Movie Data Pipeline")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG,
+                        help="saved catalog file")
+    parser.add_argument("--timings", action="store_true",
+                        help="print startup and command timings")
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    ingest = subparsers.add_parser("ingest", help="read providers into the catalog")
+    ingest.add_argument("--spec", default=DEFAULT_SPEC,
+                        help="pipeline spec (.json, .toml or .yaml)")
+    ingest.add_argument("--data-dir",
+                        help="provider files directory (default: from spec)")
+    ingest.add_argument("--parallelism", type=int,
+                        help="concurrent stages (default: from spec)")
+    ingest.add_argument("--chunk-size", type=int,
+                        help="rows per record batch (default: from spec)")
+    ingest.add_argument("--incremental", action="store_true",
+                        help="merge into the saved catalog instead of rebuilding it")
+    ingest.add_argument("--delta-out",
+                        help="write the movies changed by this run "
+                             "(.jsonl or .parquet), implies --incremental")
+    ingest.add_argument("--dedup", choices=["off", "bloom", "exact"],
+                        help="skip rows already ingested (default: from spec)")
+    ingest.add_argument("--providers", nargs="*",
+                        help="providers to ingest (default: all)")
+    ingest.set_defaults(func=cmd_ingest)
+
+    watch = subparsers.add_parser("watch",
+                                  help="ingest provider files as they are dropped")
+    watch.add_argument("--spec", default=DEFAULT_SPEC,
+                       help="pipeline spec (.json, .toml or .yaml)")
+    watch.add_argument("--drop-dir",
+                       help="directory to watch (default: spec data_dir)")
+    watch.add_argument("--poll-interval", type=float, default=1.0,
+                       help="seconds between directory scans")
+    watch.add_argument("--max-latency", type=float, default=5.0,
+                       help="seconds a file waits for others to join its batch")
+    watch.add_argument("--max-batch-files", type=int, default=100,
+                       help="files that trigger a merge right away")
+    watch.add_argument("--save-interval", type=float, default=30.0,
+                       help="seconds between catalog saves")
+    watch.add_argument("--dedup", choices=["off", "bloom", "exact"],
+                       help="skip rows already ingested (default: from spec)")
+    watch.add_argument("--once", action="store_true",
+                       help="ingest what is in the directory and exit")
+    watch.set_defaults(func=cmd_watch)
+
+    query = subparsers.add_parser("query", help="look up movies in the catalog")
+    query.add_argument("title", nargs="?")
+    query.add_argument("year", nargs="?", type=int)
+    query.set_defaults(func=cmd_query)
+
+    top = subparsers.add_parser("top", help="best movies by composite score")
+    top.add_argument("-k", type=int, default=10, help="number of movies")
+    top.add_argument("--year", type=int, help="only movies of this year")
+    top.add_argument("--spec", default=DEFAULT_SPEC,
+                     help="pipeline spec with the score weights")
+    top.set_defaults(func=cmd_top)
+
+    stats = subparsers.add_parser("stats", help="print catalog statistics")
+    stats.set_defaults(func=cmd_stats)
+
+    export = subparsers.add_parser("export", help="export the catalog")
+    export.add_argument("output")
+    export.add_argument("--format", choices=["csv", "jsonl"], default="jsonl")
+    export.set_defaults(func=cmd_export)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        args = parser.parse_args(list(argv) + ["ingest"])
+
+    startup = time.perf_counter()
+    result = args.func(args)
+    finished = time.perf_counter()
+
+    if args.timings:
+        print(f"Startup time: {(startup - _START_TIME) * 1000:.1f} ms",
+              file=sys.stderr)
+        print(f"Command time: {(finished - startup) * 1000:.1f} ms",
+              file=sys.stderr)
+
+    return result
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
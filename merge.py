@@ -0,0 +1,128 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+MERGE_FIELDS = [
+    'title',
+    'critic_score_pct',
+    'top_critic_score',
+    'total_critic_reviews',
+    'audience_avg_score',
+    'tot_audience_ratings',
+    'domestic_box_office',
+    'intl_box_office',
+    'prd_budget',
+    'market_spend'
+]
+
+
+class FieldValue(NamedTuple):
+    value: Any
+    priority: Tuple[int, int] = (0, 0)
+    timestamp: float = 0.0
+
+
+# Every policy picks a winner with a total order over the candidates (ties
+# fall through to the other attributes and finally to the value itself), or
+# combines them with an associative operation. This is what makes merges
+# commutative and associative, so records can be merged in any order.
+
+def _by_priority(a: FieldValue, b: FieldValue) -> FieldValue:
+    if (a.priority, a.timestamp, a.value) >= (b.priority, b.timestamp, b.value):
+        return a
+
+    return b
+
+
+def _by_newest(a: FieldValue, b: FieldValue) -> FieldValue:
+    if (a.timestamp, a.priority, a.value) >= (b.timestamp, b.priority, b.value):
+        return a
+
+    return b
+
+
+def _by_max(a: FieldValue, b: FieldValue) -> FieldValue:
+    if (a.value, a.priority, a.timestamp) >= (b.value, b.priority, b.timestamp):
+        return a
+
+    return b
+
+
+def _by_min(a: FieldValue, b: FieldValue) -> FieldValue:
+    if (a.value, a.priority, a.timestamp) <= (b.value, b.priority, b.timestamp):
+        return a
+
+    return b
+
+
+def _by_sum(a: FieldValue, b: FieldValue) -> FieldValue:
+    # Only exact for integer fields, float addition is not associative
+    return FieldValue(value=a.value + b.value,
+                      priority=max(a.priority, b.priority),
+                      timestamp=max(a.timestamp, b.timestamp))
+
+
+POLICIES: Dict[str, Callable[[FieldValue, FieldValue], FieldValue]] = {
+    'priority': _by_priority,
+    'newest': _by_newest,
+    'max': _by_max,
+    'min': _by_min,
+    'sum': _by_sum
+}
+
+
+@dataclass
+class FieldPolicy:
+    policy: str = 'priority'
+    providers: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown merge policy: {self.policy}")
+
+        return
+
+
+class MergePolicy:
+    def __init__(self, default: str = 'priority',
+                 fields: Optional[Dict[str, FieldPolicy]] = None):
+        self.default = FieldPolicy(default)
+        self.fields = fields or {}
+
+        return
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> 'MergePolicy':
+        fields = {}
+        for name, item in raw.get('fields', {}).items():
+            if isinstance(item, str):
+                item = {'policy': item}
+
+            fields[name] = FieldPolicy(policy=item.get('policy', 'priority'),
+                                       providers=list(item.get('providers', [])))
+
+        return cls(default=raw.get('default', 'priority'), fields=fields)
+
+    def field_policy(self, name: str) -> FieldPolicy:
+        return self.fields.get(name, self.default)
+
+    def priority(self, provider: Optional[str], precedence: int,
+                 name: str) -> Tuple[int, int]:
+        # Providers listed for a field rank above the rest, in list order.
+        # Unlisted providers fall back to their precedence.
+        providers = self.field_policy(name).providers
+        rank = len(providers) - providers.index(provider) \
+            if provider in providers else 0
+
+        return (rank, precedence)
+
+    def merge_function(self, name: str) -> Callable[[FieldValue, FieldValue],
+                                                    FieldValue]:
+        return POLICIES[self.field_policy(name).policy]
+
+    def merge(self, name: str, current: Optional[FieldValue],
+              new: FieldValue) -> FieldValue:
+        if current is None:
+            return new
+
+        return self.merge_function(name)(current, new)
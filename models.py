@@ -2,6 +2,10 @@ from dataclasses import dataclass, field
 from typing import Optional
 
 
+def movie_key(title: str, year: int) -> str:
+    return f"{title.lower().strip()}_{year}"
+
+
 @dataclass
 class Movie:
     title: str = ""
@@ -24,8 +28,20 @@ class Movie:
             return self.domestic_box_office + self.intl_box_office
         return None
 
+    def get_roi(self) -> Optional[float]:
+        total_box_office = self.get_total_box_office()
+        if total_box_office is None or self.prd_budget is None \
+        or self.market_spend is None:
+            return None
+
+        expenses = self.prd_budget + self.market_spend
+        if expenses <= 0:
+            return 0
+
+        return (total_box_office - expenses) / expenses * 100
+
     def get_movie_key(self) -> str:
-        return f"{self.title.lower().strip()}_{self.year}"
+        return movie_key(self.title, self.year)
 
 
 @dataclass
@@ -1,78 +1,216 @@
-from typing import List
+import time
+from datetime import datetime
+from queue import Full, Queue
+from threading import Event, Lock, Thread
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
 
-from models import Movie, CriticData, AudienceData, BoxOfficeData
+from batch import DEFAULT_CHUNK_SIZE, RecordBatch, chunk_records
+from dag import Stage, run_stages
 from repository import MovieRepository
-from readers.base import DataReader
+from readers.base import BatchReader, DataReader
+from registry import ProviderRegistry, ProviderSpec, default_registry
+from sketches import CatalogStats
+
+if TYPE_CHECKING:
+    from dedup import RowFilter
+
+
+# Batches a reader can read ahead of the merge of its provider
+PREFETCH_BATCHES = 4
 
 
 class MovieDataPipeline:
-    def __init__(self, repository: MovieRepository):
+    def __init__(self, repository: MovieRepository,
+                 registry: Optional[ProviderRegistry] = None,
+                 parallelism: int = 1,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 stats: Optional[CatalogStats] = None,
+                 row_filter: Optional['RowFilter'] = None):
         self.repository = repository
-        
+        self.registry = registry if registry is not None else default_registry()
+        self.parallelism = parallelism
+        self.chunk_size = chunk_size
+        self.stats = stats
+        self.row_filter = row_filter
+        if stats is not None:
+            repository.changes.subscribe_fields(stats.update_field)
+        self.drop_timestamp: Optional[float] = None
+        self._merge_lock = Lock()
+
         return
 
-    def process_critic_data(self, reader: DataReader) -> None:
-        critic_data_list: List[CriticData] = reader.read()
+    def read_batches(self, provider: ProviderSpec,
+                     reader: DataReader) -> Iterator[RecordBatch]:
+        if isinstance(reader, BatchReader):
+            return reader.read_batches(self.chunk_size)
+
+        # Readers that only return records are chunked after reading
+        columns = list(provider.fields)
+        if provider.timestamp_field is not None:
+            columns.append(provider.timestamp_field)
+
+        return chunk_records(reader.read(), columns, self.chunk_size)
+
+    def process_batch(self, batch: RecordBatch, provider: ProviderSpec,
+                      drop_timestamp: Optional[float] = None) -> None:
+        # Rows already ingested are dropped before the lazy columns are
+        # decoded and merged
+        filtered = None
+        if self.row_filter is not None:
+            columns = {movie_field: column for column, movie_field
+                       in provider.fields.items()}
+            filtered = self.row_filter.filter_batch(
+                batch, provider.name, (columns['title'], columns['year']))
+            batch = filtered.batch
+            if batch.length == 0:
+                return
+
+        started = time.perf_counter()
+        batch = batch.materialize()
+
+        timestamps = None
+        if provider.timestamp_field is not None:
+            timestamps = [_to_timestamp(value) for value
+                          in batch.column(provider.timestamp_field)]
+
+        # Providers without a timestamp field get the timestamp of the drop,
+        # so a newer drop of a provider replaces the values of an older one
+        if drop_timestamp is None:
+            drop_timestamp = self.drop_timestamp
+
+        self.repository.apply_batch(batch, provider.fields, provider.name,
+                                    provider.precedence, timestamps,
+                                    drop_timestamp)
 
-        for critic_data in critic_data_list:
-            movie = Movie(
-                title=critic_data.movie_title,
-                year=critic_data.release_year,
-                critic_score_pct=critic_data.critic_score_pct,
-                top_critic_score=critic_data.top_critic_score,
-                total_critic_reviews=critic_data.total_critic_reviews_counted
-            )
+        if self.stats is not None:
+            self.stats.update_batch(batch, provider.fields)
 
-            self.repository.add_update(movie)
+        if filtered is not None:
+            self.row_filter.record_merge(filtered,
+                                         time.perf_counter() - started)
 
         return
-    
+
+    def process_provider(self, name: str, reader: DataReader) -> None:
+        provider = self.registry.get(name)
+        drop_timestamp = self.repository.next_timestamp()
+
+        for batch in self.read_batches(provider, reader):
+            self.process_batch(batch, provider, drop_timestamp)
+
+        return
+
+    def process_critic_data(self, reader: DataReader) -> None:
+        self.process_provider('critic', reader)
+
+        return
+
     def process_audience_data(self, reader: DataReader) -> None:
-        audience_data_list: List[AudienceData] = reader.read()
-
-        for audience_data in audience_data_list:
-            movie = Movie(
-                title=audience_data.title,
-                year=audience_data.year,
-                audience_avg_score=audience_data.audience_avg_score,
-                tot_audience_ratings=audience_data.total_audience_ratings,
-                domestic_box_office=audience_data.domestic_box_office_gross
-            )
-
-            self.repository.add_update(movie)
-    
+        self.process_provider('audience', reader)
+
         return
-    
+
     def process_box_office_data(self, reader: DataReader) -> None:
-        box_office_data_list: List[BoxOfficeData] = reader.read()
-        
-        for box_office_data in box_office_data_list:
-            movie = Movie(
-                title=box_office_data.film_name,
-                year=box_office_data.release_year,
-                domestic_box_office=box_office_data.domestic_gross,
-                intl_box_office=box_office_data.intl_gross,
-                prd_budget=box_office_data.prd_budget,
-                market_spend=box_office_data.market_spend
-            )
-
-            self.repository.add_update(movie)
-    
+        self.process_provider('box_office', reader)
+
         return
 
+    def build_stages(self, readers: Dict[str, DataReader]) -> List[Stage]:
+        # Every provider is ingested in its own stage so independent readers
+        # run concurrently. The merge policies make the result independent of
+        # the merge order, so batches are merged as soon as they are read.
+        stages = []
+
+        for provider in self.registry.providers():
+            if provider.name not in readers:
+                continue
+
+            stages.append(Stage(
+                name=f"ingest:{provider.name}",
+                func=self._ingest_stage(provider, readers[provider.name]),
+                depends_on=[f"ingest:{name}" for name in provider.depends_on
+                            if name in readers]
+            ))
+
+        return stages
+
     def run(self, readers: dict) -> None:
-        # Process data in a specific order to ensure proper merging
-        # 1. Box office data (base financial information)
-        # 2. Audience data (ratings and additional box office)
-        # 3. Critic data (reviews and scores)
-        
-        if 'box_office' in readers:
-            self.process_box_office_data(readers['box_office'])
+        # Every provider read in one run is one drop
+        self.drop_timestamp = self.repository.next_timestamp()
+        run_stages(self.build_stages(readers), self.parallelism)
+
+        return
+
+    def _ingest_stage(self, provider: ProviderSpec, reader: DataReader):
+        def ingest(results: Dict[str, Any]) -> None:
+            batches = self.read_batches(provider, reader)
+
+            # With parallel stages the reader runs ahead of the merge in a
+            # thread of its own, at most PREFETCH_BATCHES batches ahead
+            if self.parallelism > 1:
+                batches = _prefetch(batches, PREFETCH_BATCHES)
+
+            for batch in batches:
+                # The repository is not thread safe, only one merge at a time
+                with self._merge_lock:
+                    self.process_batch(batch, provider)
+
+            return
+
+        return ingest
 
-        if 'audience' in readers:
-            self.process_audience_data(readers['audience'])
 
-        if 'critic' in readers:
-            self.process_critic_data(readers['critic'])
+def _prefetch(batches: Iterator[RecordBatch],
+              depth: int) -> Iterator[RecordBatch]:
+    queue: Queue = Queue(maxsize=depth)
+    stop = Event()
+
+    def put(item: Tuple[Optional[RecordBatch], Optional[BaseException]]) -> bool:
+        # Gives up when the consumer has stopped, so the thread never blocks
+        # on a full queue nobody reads
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+
+        return False
+
+    def produce() -> None:
+        try:
+            for batch in batches:
+                if not put((batch, None)):
+                    return
+        except BaseException as error:
+            put((None, error))
+            return
+
+        put((None, None))
 
         return
+
+    producer = Thread(target=produce, daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            batch, error = queue.get()
+            if error is not None:
+                raise error
+            if batch is None:
+                break
+
+            yield batch
+    finally:
+        stop.set()
+        producer.join()
+
+    return
+
+
+def _to_timestamp(value: Any) -> float:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+
+    return float(value)
@@ -1,31 +1,46 @@
 import json
-from typing import List
+from dataclasses import fields
+from typing import Iterator, List
 from pathlib import Path
 
-from readers.base import DataReader
+from batch import DEFAULT_CHUNK_SIZE, BatchBuilder, RecordBatch
+from readers.base import BatchReader
 from models import AudienceData
 
 
-class AudiencePulseReader(DataReader):
+AUDIENCE_COLUMNS = [f.name for f in fields(AudienceData)]
+
+
+class AudiencePulseReader(BatchReader):
     def __init__(self, file_path: str):
         self.file_path = Path(file_path)
 
         return
     
     def read(self) -> List[AudienceData]:
+        return [AudienceData(**row)
+                for batch in self.read_batches() for row in batch.rows()]
+
+    def read_batches(self,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[RecordBatch]:
         with open(self.file_path, 'r') as fp:
             raw_data = json.load(fp)
 
-        audience_data_list = []
+        builder = BatchBuilder(AUDIENCE_COLUMNS, chunk_size)
 
         for item in raw_data:
-            audience_data = AudienceData(
-                title=item['title'],
-                year=int(item['year']),
-                audience_avg_score=float(item['audience_average_score']),
-                total_audience_ratings=int(item['total_audience_ratings']),
-                domestic_box_office_gross=int(item['domestic_box_office_gross'])
-            )
-            audience_data_list.append(audience_data)
-
-        return audience_data_list
+            batch = builder.append((
+                item['title'],
+                int(item['year']),
+                float(item['audience_average_score']),
+                int(item['total_audience_ratings']),
+                int(item['domestic_box_office_gross'])
+            ))
+            if batch is not None:
+                yield batch
+
+        batch = builder.flush()
+        if batch is not None:
+            yield batch
+
+        return
@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import List, Any
+from typing import Iterator, List, Any
+
+from batch import DEFAULT_CHUNK_SIZE, RecordBatch
 
 
 class DataReader(ABC):
@@ -7,3 +9,9 @@ class DataReader(ABC):
     def read(self) -> List[Any]:
         pass
 
+
+class BatchReader(DataReader):
+    @abstractmethod
+    def read_batches(self,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[RecordBatch]:
+        pass
@@ -1,83 +1,131 @@
 import csv
-from typing import List, Dict
+from dataclasses import fields
+from typing import Any, Callable, Dict, Iterator, List, Optional
 from pathlib import Path
 
-from readers.base import DataReader
+from batch import DEFAULT_CHUNK_SIZE, RecordBatch, chunk_columns
+from readers.base import BatchReader
+from readers.mmap_csv import TEXT, MmapCsvScanner, raw_text
 from models import BoxOfficeData
 
 
-class BoxOfficeMetricsReader(DataReader):
-    def __init__(self, domestic_path: str, 
-                 international_path: str, financials_path: str):
-        self.domestic_path = Path(domestic_path)
-        self.international_path = Path(international_path)
-        self.financials_path = Path(financials_path)
+BOX_OFFICE_COLUMNS = [f.name for f in fields(BoxOfficeData)]
+
+GROSS_CSV_COLUMNS = {
+    'film_name': TEXT,
+    'year_of_release': int,
+    'box_office_gross_usd': int
+}
+
+FINANCIALS_CSV_COLUMNS = {
+    'film_name': TEXT,
+    'year_of_release': int,
+    'production_budget_usd': int,
+    'marketing_spend_usd': int
+}
+
+
+class BoxOfficeMetricsReader(BatchReader):
+    def __init__(self, domestic_path: Optional[str], 
+                 international_path: Optional[str],
+                 financials_path: Optional[str], mode: str = 'csv'):
+        # A missing path skips that file, e.g. when only one of the three
+        # feeds has new rows
+        self.domestic_path = Path(domestic_path) if domestic_path else None
+        self.international_path = Path(international_path) \
+            if international_path else None
+        self.financials_path = Path(financials_path) if financials_path else None
+        self.mode = mode
     
         return
 
     def read(self) -> List[BoxOfficeData]:
-        movies_dict: Dict[tuple, BoxOfficeData] = {}
+        return [BoxOfficeData(**row) for batch in self.read_batches()
+                for row in batch.materialize().rows()]
 
-        self._read_domestic_box_office(movies_dict)
-        self._read_international_box_office(movies_dict)
-        self._read_financial_data(movies_dict)
+    def read_batches(self,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[RecordBatch]:
+        # The three files are joined on (film_name, year) straight into
+        # columns, every movie gets one row index
+        rows: Dict[tuple, int] = {}
+        columns: Dict[str, List[Any]] = {name: [] for name in BOX_OFFICE_COLUMNS}
 
-        return list(movies_dict.values())
+        self._read_domestic_box_office(rows, columns)
+        self._read_international_box_office(rows, columns)
+        self._read_financial_data(rows, columns)
 
-    def _read_domestic_box_office(self, 
-                                  movies_dict: 
-                                      Dict[tuple, BoxOfficeData]) -> None:
-        with open(self.domestic_path, 'r') as fp:
-            reader = csv.DictReader(fp)
+        lazy = ['film_name'] if self.mode == 'mmap' else []
+        yield from chunk_columns(columns, chunk_size, lazy)
 
-            for row in reader:
-                key = (row['film_name'], int(row['year_of_release']))
+        return
 
-                if key not in movies_dict:
-                    movies_dict[key] = BoxOfficeData(
-                        film_name=row['film_name'],
-                        release_year=int(row['year_of_release'])
-                    )
+    def _read_rows(self, path: Optional[Path],
+                   parsers: Dict[str, Callable]) -> Iterator[tuple]:
+        if path is None:
+            return
 
-                movies_dict[key].domestic_gross = int(
-                    row['box_office_gross_usd'])
+        if self.mode == 'mmap':
+            for batch in MmapCsvScanner(path, parsers).scan():
+                yield from zip(*batch.columns.values())
 
-        return
-    
-    def _read_international_box_office(self, 
-                                       movies_dict: 
-                                           Dict[tuple, BoxOfficeData]) -> None:
-        with open(self.international_path, 'r') as fp:
+            return
+
+        with open(path, 'r') as fp:
             reader = csv.DictReader(fp)
 
             for row in reader:
-                key = (row['film_name'], int(row['year_of_release']))
+                yield tuple(row[name] if parser is TEXT else parser(row[name])
+                            for name, parser in parsers.items())
+
+        return
 
-                if key not in movies_dict:
-                    movies_dict[key] = BoxOfficeData(
-                        film_name=row['film_name'],
-                        release_year=int(row['year_of_release'])
-                    )
+    def _row_index(self, rows: Dict[tuple, int],
+                   columns: Dict[str, List[Any]], film_name: Any,
+                   year: int) -> int:
+        # Titles are compared as raw bytes, lazy titles are not decoded
+        key = (raw_text(film_name), year)
 
-                movies_dict[key].intl_gross = int(row['box_office_gross_usd'])
+        if key not in rows:
+            rows[key] = len(columns['film_name'])
+            for values in columns.values():
+                values.append(None)
+
+            columns['film_name'][-1] = film_name
+            columns['release_year'][-1] = year
+
+        return rows[key]
+
+    def _read_domestic_box_office(self, rows: Dict[tuple, int],
+                                  columns: Dict[str, List[Any]]) -> None:
+        domestic_gross = columns['domestic_gross']
+
+        for film_name, year, gross in self._read_rows(
+                self.domestic_path, GROSS_CSV_COLUMNS):
+            index = self._row_index(rows, columns, film_name, year)
+            domestic_gross[index] = gross
 
         return
+    
+    def _read_international_box_office(self, rows: Dict[tuple, int],
+                                       columns: Dict[str, List[Any]]) -> None:
+        intl_gross = columns['intl_gross']
 
-    def _read_financial_data(self, 
-                             movies_dict: Dict[tuple, BoxOfficeData]) -> None:
-        with open(self.financials_path, 'r') as fp:
-            reader = csv.DictReader(fp)
+        for film_name, year, gross in self._read_rows(
+                self.international_path, GROSS_CSV_COLUMNS):
+            index = self._row_index(rows, columns, film_name, year)
+            intl_gross[index] = gross
 
-            for row in reader:
-                key = (row['film_name'], int(row['year_of_release']))
+        return
 
-                if key not in movies_dict:
-                    movies_dict[key] = BoxOfficeData(
-                        film_name=row['film_name'],
-                        release_year=int(row['year_of_release'])
-                    )
+    def _read_financial_data(self, rows: Dict[tuple, int],
+                             columns: Dict[str, List[Any]]) -> None:
+        prd_budget = columns['prd_budget']
+        market_spend = columns['market_spend']
 
-                movies_dict[key].prd_budget = int(row['production_budget_usd'])
-                movies_dict[key].market_spend = int(row['marketing_spend_usd'])
+        for film_name, year, budget, spend in self._read_rows(
+                self.financials_path, FINANCIALS_CSV_COLUMNS):
+            index = self._row_index(rows, columns, film_name, year)
+            prd_budget[index] = budget
+            market_spend[index] = spend
 
         return
@@ -1,32 +1,62 @@
 import csv
-from typing import List
+from dataclasses import fields
+from typing import Iterator, List
 from pathlib import Path
 
-from readers.base import DataReader
+from batch import DEFAULT_CHUNK_SIZE, BatchBuilder, RecordBatch
+from readers.base import BatchReader
+from readers.mmap_csv import TEXT, MmapCsvScanner
 from models import CriticData
 
 
-class CriticAggReader(DataReader):
-    def __init__(self, file_path: str):
+CRITIC_COLUMNS = [f.name for f in fields(CriticData)]
+
+CRITIC_CSV_COLUMNS = {
+    'movie_title': TEXT,
+    'release_year': int,
+    'critic_score_percentage': int,
+    'top_critic_score': float,
+    'total_critic_reviews_counted': int
+}
+
+
+class CriticAggReader(BatchReader):
+    def __init__(self, file_path: str, mode: str = 'csv'):
         self.file_path = Path(file_path)
+        self.mode = mode
         
         return
     
     def read(self) -> List[CriticData]:
-        critic_data_list = []
-        
+        return [CriticData(**row) for batch in self.read_batches()
+                for row in batch.materialize().rows()]
+
+    def read_batches(self,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[RecordBatch]:
+        if self.mode == 'mmap':
+            scanner = MmapCsvScanner(self.file_path, CRITIC_CSV_COLUMNS)
+            yield from scanner.scan(CRITIC_COLUMNS, chunk_size)
+
+            return
+
+        builder = BatchBuilder(CRITIC_COLUMNS, chunk_size)
+
         with open(self.file_path, 'r') as fp:
             reader = csv.DictReader(fp)
 
             for row in reader:
-                critic_data = CriticData(
-                    movie_title=row['movie_title'],
-                    release_year=int(row['release_year']),
-                    critic_score_pct=int(row['critic_score_percentage']),
-                    top_critic_score=float(row['top_critic_score']),
-                    total_critic_reviews_counted=int(row[
-                        'total_critic_reviews_counted'])
-                )
-                critic_data_list.append(critic_data)
-
-        return critic_data_list
+                batch = builder.append((
+                    row['movie_title'],
+                    int(row['release_year']),
+                    int(row['critic_score_percentage']),
+                    float(row['top_critic_score']),
+                    int(row['total_critic_reviews_counted'])
+                ))
+                if batch is not None:
+                    yield batch
+
+        batch = builder.flush()
+        if batch is not None:
+            yield batch
+
+        return
@@ -0,0 +1,143 @@
+import csv
+import io
+import mmap
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+from batch import DEFAULT_CHUNK_SIZE, RecordBatch
+
+
+def raw_text(value: Union[bytes, str]) -> bytes:
+    if isinstance(value, bytes):
+        return value
+
+    return value.encode('utf-8')
+
+
+# Parser marker for text fields: they are kept as the raw bytes sliced from
+# the file and only decoded by RecordBatch.materialize()
+TEXT = bytes
+
+BLOCK_SIZE = 1 << 20
+
+
+class MmapCsvScanner:
+    def __init__(self, path: Path, columns: Dict[str, Callable[[bytes], Any]]):
+        # columns maps the CSV header names to read onto a parser taking the
+        # raw bytes of the field: int, float or TEXT
+        self.path = Path(path)
+        self.columns = columns
+
+        return
+
+    def scan(self, names: Optional[List[str]] = None,
+             chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[RecordBatch]:
+        if names is None:
+            names = list(self.columns)
+
+        with open(self.path, 'rb') as fp:
+            if fp.seek(0, 2) == 0:
+                return
+
+            buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        with buffer:
+            yield from self._scan_buffer(buffer, names, chunk_size)
+
+        return
+
+    def _scan_buffer(self, buffer: mmap.mmap, names: List[str],
+                     chunk_size: int) -> Iterator[RecordBatch]:
+        size = len(buffer)
+        header_end = buffer.find(b'\n')
+        if header_end < 0:
+            header_end = size
+
+        header = next(csv.reader(
+            [buffer[:header_end].decode('utf-8').rstrip('\r')]))
+        positions = [header.index(column) for column in self.columns]
+        parsers = list(self.columns.values())
+        last_position = max(positions)
+
+        lazy = [name for name, parser in zip(names, parsers) if parser is TEXT]
+        pending: List[List[Any]] = [[] for _ in names]
+        block_start = header_end + 1
+
+        while block_start < size:
+            # Lines are split out of ~1MB blocks of the mapping at a time,
+            # a block always ends on a line break
+            block_end = min(block_start + BLOCK_SIZE, size)
+            if block_end < size:
+                block_end = buffer.rfind(b'\n', block_start, block_end) + 1
+                if block_end <= block_start:
+                    block_end = buffer.find(b'\n', block_start) + 1 or size
+
+            # An odd number of quotes means the block ends inside a quoted
+            # field holding a line break, it grows until the field is closed
+            block = buffer[block_start:block_end]
+            quotes = block.count(b'"')
+            while quotes % 2 and block_end < size:
+                next_end = buffer.find(b'\n', block_end) + 1 or size
+                line = buffer[block_end:next_end]
+                quotes += line.count(b'"')
+                block += line
+                block_end = next_end
+            for column, values in zip(pending,
+                                      self._parse_block(block, positions,
+                                                        parsers, last_position)):
+                column.extend(values)
+
+            offset = 0
+            while len(pending[0]) - offset >= chunk_size:
+                yield RecordBatch(
+                    columns={name: column[offset:offset + chunk_size]
+                             for name, column in zip(names, pending)},
+                    length=chunk_size, lazy=lazy)
+                offset += chunk_size
+
+            if offset:
+                pending = [column[offset:] for column in pending]
+
+            block_start = block_end
+
+        if pending[0]:
+            yield RecordBatch(columns=dict(zip(names, pending)),
+                              length=len(pending[0]), lazy=lazy)
+
+        return
+
+    def _parse_block(self, block: bytes, positions: List[int],
+                     parsers: List[Callable], last_position: int) -> List[List[Any]]:
+        if b'"' in block:
+            return self._parse_quoted(block, positions, parsers, last_position)
+
+        lines = block.replace(b'\r\n', b'\n').split(b'\n')
+        lines = [line for line in lines if line]
+        if not lines:
+            return [[] for _ in positions]
+
+        # Every line is split once and the needed fields are parsed a whole
+        # column at a time, so the per-row work stays inside C loops
+        split_lines = [line.split(b',', last_position + 1) for line in lines]
+        if min(map(len, split_lines)) <= last_position:
+            raise ValueError(f"Missing fields in {self.path}")
+
+        fields = list(zip(*split_lines))
+
+        return [list(fields[position]) if parser is TEXT
+                else list(map(parser, fields[position]))
+                for position, parser in zip(positions, parsers)]
+
+    def _parse_quoted(self, block: bytes, positions: List[int],
+                      parsers: List[Callable],
+                      last_position: int) -> List[List[Any]]:
+        # Quoted fields can hold commas and line breaks, these rare blocks go
+        # through csv
+        rows = [row for row in csv.reader(io.StringIO(block.decode('utf-8'),
+                                                      newline=''))
+                if row]
+        if any(len(row) <= last_position for row in rows):
+            raise ValueError(f"Missing fields in {self.path}")
+
+        return [[parser(row[position].encode('utf-8')) for row in rows]
+                for position, parser in zip(positions, parsers)]
@@ -0,0 +1,171 @@
+import json
+from dataclasses import dataclass, field
+from importlib import import_module
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Type
+
+from batch import DEFAULT_CHUNK_SIZE
+from merge import MergePolicy
+from readers.base import DataReader
+
+if TYPE_CHECKING:
+    from dedup import RowFilter
+
+
+DEFAULT_SPEC = Path(__file__).resolve().parent / "pipeline.json"
+
+
+@dataclass
+class ProviderSpec:
+    name: str
+    reader: str
+    options: Dict[str, Any] = field(default_factory=dict)
+    fields: Dict[str, str] = field(default_factory=dict)
+    precedence: int = 0
+    depends_on: List[str] = field(default_factory=list)
+    timestamp_field: Optional[str] = None
+    watch: Dict[str, str] = field(default_factory=dict)
+
+    def load_reader_class(self) -> Type[DataReader]:
+        # Reader modules are only imported once the provider is used, so
+        # commands that never read provider files do not pay for them
+        module_name, class_name = self.reader.split(':')
+        module = import_module(module_name)
+
+        return getattr(module, class_name)
+
+    def build_reader(self, data_dir: Path) -> DataReader:
+        reader_class = self.load_reader_class()
+        options = {
+            name: str(Path(data_dir) / value) if name.endswith('path') else value
+            for name, value in self.options.items()
+        }
+
+        return reader_class(**options)
+
+    def build_file_reader(self, option: str, path: Path) -> DataReader:
+        # Reader for a single file dropped for one of the path options, the
+        # other path options are left out
+        reader_class = self.load_reader_class()
+        options = {
+            name: None if name.endswith('path') else value
+            for name, value in self.options.items()
+        }
+        options[option] = str(path)
+
+        return reader_class(**options)
+
+
+class ProviderRegistry:
+    def __init__(self):
+        self._providers: Dict[str, ProviderSpec] = {}
+
+        return
+
+    def register(self, provider: ProviderSpec) -> None:
+        self._providers[provider.name] = provider
+
+        return
+
+    def get(self, name: str) -> ProviderSpec:
+        if name not in self._providers:
+            raise KeyError(f"Unknown provider: {name}")
+
+        return self._providers[name]
+
+    def names(self) -> List[str]:
+        return [provider.name for provider in self.providers()]
+
+    def providers(self) -> List[ProviderSpec]:
+        return sorted(self._providers.values(),
+                      key=lambda provider: (provider.precedence, provider.name))
+
+    def build_readers(self, data_dir: Path,
+                      names: List[str] = None) -> Dict[str, DataReader]:
+        if names is None:
+            names = self.names()
+
+        return {name: self.get(name).build_reader(data_dir) for name in names}
+
+
+@dataclass
+class PipelineSpec:
+    providers: List[ProviderSpec] = field(default_factory=list)
+    data_dir: str = "data"
+    parallelism: int = 1
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    merge: Dict[str, Any] = field(default_factory=dict)
+    scoring: Dict[str, Any] = field(default_factory=dict)
+    dedup: Dict[str, Any] = field(default_factory=dict)
+
+    def merge_policy(self) -> MergePolicy:
+        return MergePolicy.from_dict(self.merge)
+
+    def row_filter(self, mode: Optional[str] = None) -> Optional['RowFilter']:
+        mode = mode or self.dedup.get('mode', 'off')
+        if mode == 'off':
+            return None
+
+        # dedup needs NumPy, it is only imported when dedup is on
+        from dedup import RowFilter
+
+        return RowFilter(mode, float(self.dedup.get('error_rate', 0.001)),
+                         int(self.dedup.get('capacity', 100000)))
+
+    def registry(self) -> ProviderRegistry:
+        registry = ProviderRegistry()
+        for provider in self.providers:
+            registry.register(provider)
+
+        return registry
+
+
+def _read_spec_file(path: Path) -> Dict[str, Any]:
+    if path.suffix == '.toml':
+        import tomllib
+
+        with open(path, 'rb') as fp:
+            return tomllib.load(fp)
+
+    if path.suffix in ('.yaml', '.yml'):
+        import yaml
+
+        with open(path, 'r') as fp:
+            return yaml.safe_load(fp)
+
+    with open(path, 'r') as fp:
+        return json.load(fp)
+
+
+def load_pipeline_spec(path: str = DEFAULT_SPEC) -> PipelineSpec:
+    raw_spec = _read_spec_file(Path(path))
+
+    providers = []
+    for item in raw_spec.get('providers', []):
+        if 'name' not in item or 'reader' not in item:
+            raise ValueError(f"Provider needs a name and a reader: {item}")
+
+        providers.append(ProviderSpec(
+            name=item['name'],
+            reader=item['reader'],
+            options=item.get('options', {}),
+            fields=item.get('fields', {}),
+            precedence=int(item.get('precedence', 0)),
+            depends_on=list(item.get('depends_on', [])),
+            timestamp_field=item.get('timestamp_field'),
+            watch=item.get('watch', {})
+        ))
+
+    return PipelineSpec(
+        providers=providers,
+        data_dir=raw_spec.get('data_dir', "data"),
+        parallelism=int(raw_spec.get('parallelism', 1)),
+        chunk_size=int(raw_spec.get('chunk_size', DEFAULT_CHUNK_SIZE)),
+        merge=raw_spec.get('merge', {}),
+        scoring=raw_spec.get('scoring', {}),
+        dedup=raw_spec.get('dedup', {})
+    )
+
+
+def default_registry() -> ProviderRegistry:
+    return load_pipeline_spec(DEFAULT_SPEC).registry()
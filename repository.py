@@ -1,27 +1,105 @@
+import json
+import time
+from dataclasses import asdict
+from pathlib import Path
 from typing import Dict, Optional, List
-from models import Movie
+
+from changes import ChangeLog
+from merge import MERGE_FIELDS, FieldValue, MergePolicy
+from batch import RecordBatch
+from models import Movie, movie_key
 
 
 class MovieRepository:
-    def __init__(self):
+    def __init__(self, merge_policy: Optional[MergePolicy] = None):
         self._movies: Dict[str, Movie] = {}
+        self._values: Dict[str, Dict[str, FieldValue]] = {}
+        self.merge_policy = merge_policy if merge_policy is not None \
+            else MergePolicy()
+        self.changes = ChangeLog()
+        self._last_timestamp = 0.0
 
         return
 
-    def add_update(self, movie: Movie) -> None:
+    def next_timestamp(self) -> float:
+        # Timestamp of a drop of provider data: the wall clock, forced to
+        # increase so a later drop of a provider wins over an earlier one
+        self._last_timestamp = max(time.time(), self._last_timestamp + 1e-6)
+
+        return self._last_timestamp
+
+    def add_update(self, movie: Movie, provider: Optional[str] = None,
+                   precedence: int = 0,
+                   timestamp: Optional[float] = None) -> None:
         key = movie.get_movie_key()
+        if timestamp is None:
+            timestamp = self.next_timestamp()
 
-        if key in self._movies:
-            existing_movie = self._movies[key]
-            self._merge_movie_data(existing_movie, movie)
-        else:
-            self._movies[key] = movie
+        for name in MERGE_FIELDS:
+            value = getattr(movie, name)
+            if value is None:
+                continue
+
+            self._merge_field(key, movie.year, name, FieldValue(
+                value=value,
+                priority=self.merge_policy.priority(provider, precedence, name),
+                timestamp=timestamp
+            ))
+
+        return
+
+    def apply_batch(self, batch: RecordBatch, fields: Dict[str, str],
+                    provider: Optional[str] = None, precedence: int = 0,
+                    timestamps: Optional[List[float]] = None,
+                    drop_timestamp: Optional[float] = None) -> None:
+        # Same merge as add_update, but straight from the batch columns, with
+        # the column lookups and field priorities resolved once per batch.
+        # Rows without their own timestamp get the one of the drop.
+        if drop_timestamp is None:
+            drop_timestamp = self.next_timestamp()
+
+        columns = {movie_field: batch.column(column)
+                   for column, movie_field in fields.items()}
+        titles = columns['title']
+        years = columns['year']
+        merged_columns = [
+            (name, columns[name],
+             self.merge_policy.priority(provider, precedence, name),
+             self.merge_policy.merge_function(name))
+            for name in MERGE_FIELDS if name in columns
+        ]
+
+        for row in range(batch.length):
+            year = years[row]
+            key = movie_key(titles[row], year)
+            timestamp = timestamps[row] if timestamps is not None \
+                else drop_timestamp
+
+            for name, values, priority, merge_function in merged_columns:
+                value = values[row]
+                if value is None:
+                    continue
+
+                self._merge_field(key, year, name,
+                                  FieldValue(value, priority, timestamp),
+                                  merge_function)
+
+        return
+
+    def merge(self, other: 'MovieRepository') -> None:
+        for key, values in other._values.items():
+            year = other._movies[key].year
+            for name, value in values.items():
+                self._merge_field(key, year, name, value)
+
+        self._last_timestamp = max(self._last_timestamp, other._last_timestamp)
 
         return
 
     def search(self, title: str, year: int) -> Optional[Movie]:
-        key = f"{title.lower().strip()}_{year}"
+        return self._movies.get(movie_key(title, year))
 
+    def get(self, key: str) -> Optional[Movie]:
         return self._movies.get(key)
     
     def search_all(self) -> List[Movie]:
@@ -30,32 +108,78 @@ class MovieRepository:
     def count(self) -> int:
         return len(self._movies)
 
-    def _merge_movie_data(self, existing: Movie, new: Movie) -> None:
-        if new.critic_score_pct is not None:
-            existing.critic_score_pct = new.critic_score_pct
-        
-        if new.top_critic_score is not None:
-            existing.top_critic_score = new.top_critic_score
-        
-        if new.total_critic_reviews is not None:
-            existing.total_critic_reviews = new.total_critic_reviews
-        
-        if new.audience_avg_score is not None:
-            existing.audience_avg_score = new.audience_avg_score
-        
-        if new.tot_audience_ratings is not None:
-            existing.tot_audience_ratings = new.tot_audience_ratings
-        
-        if new.domestic_box_office is not None:
-            existing.domestic_box_office = new.domestic_box_office
-        
-        if new.intl_box_office is not None:
-            existing.intl_box_office = new.intl_box_office
-        
-        if new.prd_budget is not None:
-            existing.prd_budget = new.prd_budget
-        
-        if new.market_spend is not None:
-            existing.market_spend = new.market_spend
+    def save(self, path: str) -> None:
+        # Field priorities and timestamps are saved with the movies so an
+        # incremental ingest merges against the catalog as if it never stopped
+        catalog = {
+            'movies': [asdict(movie) for movie in self._movies.values()],
+            'values': {
+                key: {name: [value.value, list(value.priority), value.timestamp]
+                      for name, value in values.items()}
+                for key, values in self._values.items()
+            }
+        }
+
+        with open(path, 'w') as fp:
+            json.dump(catalog, fp)
+
+        return
+
+    @classmethod
+    def load(cls, path: str,
+             merge_policy: Optional[MergePolicy] = None) -> 'MovieRepository':
+        with open(Path(path), 'r') as fp:
+            catalog = json.load(fp)
+
+        repository = cls(merge_policy)
+        values = catalog.get('values')
+
+        for item in catalog['movies']:
+            movie = Movie(**item)
+            key = movie.get_movie_key()
+
+            if values is None or key not in values:
+                repository.add_update(movie)
+                continue
+
+            repository._movies[key] = movie
+            repository._values[key] = {
+                name: FieldValue(value=value, priority=tuple(priority),
+                                 timestamp=timestamp)
+                for name, (value, priority, timestamp) in values[key].items()
+            }
+            repository._last_timestamp = max(
+                [repository._last_timestamp] + [value.timestamp for value
+                                                in repository._values[key].values()])
+
+        repository.changes.drain()
+
+        return repository
+
+    def _merge_field(self, key: str, year: int, name: str,
+                     new: FieldValue, merge_function=None) -> None:
+        if key not in self._movies:
+            self._movies[key] = Movie(year=year)
+            self._values[key] = {}
+            self.changes.record_insert(key, year)
+
+        movie = self._movies[key]
+        values = self._values[key]
+        current = values.get(name)
+        if current is None:
+            merged = new
+        elif merge_function is not None:
+            merged = merge_function(current, new)
+        else:
+            merged = self.merge_policy.merge(name, current, new)
+
+        if merged is current:
+            return
+
+        values[name] = merged
+        setattr(movie, name, merged.value)
+        self.changes.record_update(key, movie.title, year, name,
+                                   None if current is None else current.value,
+                                   merged.value)
 
         return
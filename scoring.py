@@ -0,0 +1,255 @@
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from models import Movie, movie_key
+from repository import MovieRepository
+
+
+SCORE_COLUMNS = [
+    'critic_score_pct',
+    'total_critic_reviews',
+    'top_critic_score',
+    'audience_avg_score',
+    'tot_audience_ratings'
+]
+
+
+@dataclass
+class ScoreWeights:
+    critic: float = 0.4
+    top_critic: float = 0.2
+    audience: float = 0.4
+    critic_prior_reviews: float = 50.0
+    audience_prior_ratings: float = 10000.0
+
+    def __post_init__(self):
+        if self.critic_prior_reviews <= 0 or self.audience_prior_ratings <= 0:
+            raise ValueError("Prior counts must be positive")
+
+        if self.critic + self.top_critic + self.audience <= 0:
+            raise ValueError("At least one score weight must be positive")
+
+        return
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> 'ScoreWeights':
+        return cls(**{name: float(value) for name, value in raw.items()})
+
+
+def _bayesian_average(ratings: np.ndarray, counts: np.ndarray,
+                      prior_count: float, prior_mean: float) -> np.ndarray:
+    # Movies with few ratings are pulled towards the catalog mean, a missing
+    # rating is the catalog mean
+    missing = np.isnan(ratings)
+    ratings = np.where(missing, prior_mean, ratings)
+    counts = np.where(missing | np.isnan(counts), 0.0, counts)
+
+    return (counts * ratings + prior_count * prior_mean) / (counts + prior_count)
+
+
+class ScoringEngine:
+    def __init__(self, repository: MovieRepository,
+                 weights: Optional[ScoreWeights] = None):
+        self.repository = repository
+        self.weights = weights if weights is not None else ScoreWeights()
+
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._years: List[int] = []
+        self._values = np.empty((0, len(SCORE_COLUMNS)))
+        self._scores = np.empty(0)
+        self._priors = np.full(3, 0.5)
+
+        # Scored movies as (-score, key), best first, for the whole catalog
+        # and for every year
+        self._ranking: List[Tuple[float, str]] = []
+        self._year_rankings: Dict[int, List[Tuple[float, str]]] = {}
+
+        self._dirty: Set[str] = set()
+        repository.changes.subscribe(self._mark_dirty)
+
+        self.rebuild()
+
+        return
+
+    def rebuild(self) -> None:
+        movies = self.repository.search_all()
+
+        self._keys = [movie.get_movie_key() for movie in movies]
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._years = [movie.year for movie in movies]
+        self._values = self._movie_values(movies)
+        self._priors = self._catalog_priors(self._values)
+        self._scores = self._score_values(self._values)
+        self._dirty = set()
+
+        self._rank_all()
+
+        return
+
+    def refresh(self) -> int:
+        # Only the movies changed since the last refresh are scored again.
+        # The catalog means stay as computed by the last rebuild.
+        if not self._dirty:
+            return 0
+
+        dirty = sorted(self._dirty)
+        self._dirty = set()
+
+        movies = [self.repository.get(key) for key in dirty]
+        new_rows = [(key, movie.year) for key, movie in zip(dirty, movies)
+                    if key not in self._rows]
+        if new_rows:
+            self._add_rows(new_rows)
+
+        rows = np.array([self._rows[key] for key in dirty])
+        values = self._movie_values(movies)
+        scores = self._score_values(values)
+
+        for row, key, score in zip(rows, dirty, scores):
+            self._unrank(key, self._scores[row], self._years[row])
+            self._rank(key, score, self._years[row])
+
+        self._values[rows] = values
+        self._scores[rows] = scores
+
+        return len(dirty)
+
+    def score(self, title: str, year: int) -> Optional[float]:
+        row = self._rows.get(movie_key(title, year))
+        if row is None or np.isnan(self._scores[row]):
+            return None
+
+        return float(self._scores[row])
+
+    def percentile(self, title: str, year: int) -> Optional[float]:
+        key = movie_key(title, year)
+        score = self.score(title, year)
+        if score is None:
+            return None
+
+        position = bisect_left(self._ranking, (-score, key))
+
+        return float(self._percentiles(len(self._ranking))[position])
+
+    def percentiles(self) -> Dict[str, float]:
+        percentiles = self._percentiles(len(self._ranking))
+
+        return {key: float(percentile) for (_, key), percentile
+                in zip(self._ranking, percentiles)}
+
+    def top(self, k: int, year: Optional[int] = None) -> List[Tuple[Movie, float]]:
+        ranking = self._ranking if year is None \
+            else self._year_rankings.get(year, [])
+
+        return [(self.repository.get(key), -negative_score)
+                for negative_score, key in ranking[:k]]
+
+    def _mark_dirty(self, key: str) -> None:
+        self._dirty.add(key)
+
+        return
+
+    def _movie_values(self, movies: List[Movie]) -> np.ndarray:
+        values = np.array([
+            [np.nan if getattr(movie, name) is None else getattr(movie, name)
+             for name in SCORE_COLUMNS]
+            for movie in movies
+        ], dtype=float)
+
+        return values.reshape(len(movies), len(SCORE_COLUMNS))
+
+    def _catalog_priors(self, values: np.ndarray) -> np.ndarray:
+        normalized = values[:, [0, 2, 3]] / np.array([100.0, 10.0, 10.0])
+        priors = np.full(3, 0.5)
+
+        for column in range(3):
+            known = normalized[:, column][~np.isnan(normalized[:, column])]
+            if known.size:
+                priors[column] = known.mean()
+
+        return priors
+
+    def _score_values(self, values: np.ndarray) -> np.ndarray:
+        weights = self.weights
+
+        critic = _bayesian_average(values[:, 0] / 100.0, values[:, 1],
+                                   weights.critic_prior_reviews, self._priors[0])
+        top_critic = _bayesian_average(values[:, 2] / 10.0, values[:, 1],
+                                       weights.critic_prior_reviews,
+                                       self._priors[1])
+        audience = _bayesian_average(values[:, 3] / 10.0, values[:, 4],
+                                     weights.audience_prior_ratings,
+                                     self._priors[2])
+
+        total_weight = weights.critic + weights.top_critic + weights.audience
+        scores = (weights.critic * critic + weights.top_critic * top_critic
+                  + weights.audience * audience) / total_weight * 100.0
+
+        # Movies without any rating are left unscored instead of getting the
+        # catalog mean
+        unrated = np.isnan(values[:, [0, 2, 3]]).all(axis=1)
+        scores[unrated] = np.nan
+
+        return scores
+
+    def _add_rows(self, rows: List[Tuple[str, int]]) -> None:
+        for key, year in rows:
+            self._rows[key] = len(self._keys)
+            self._keys.append(key)
+            self._years.append(year)
+
+        added = len(rows)
+        self._values = np.vstack(
+            [self._values, np.full((added, len(SCORE_COLUMNS)), np.nan)])
+        self._scores = np.concatenate([self._scores, np.full(added, np.nan)])
+
+        return
+
+    def _rank_all(self) -> None:
+        scored = np.flatnonzero(~np.isnan(self._scores))
+        keys = np.array(self._keys, dtype=object)[scored]
+
+        # Best score first, ties by key so the order is deterministic
+        order = scored[np.lexsort((keys.astype(str), -self._scores[scored]))] \
+            if scored.size else scored
+
+        self._ranking = [(-float(self._scores[row]), self._keys[row])
+                         for row in order]
+        self._year_rankings = {}
+        for entry, row in zip(self._ranking, order):
+            self._year_rankings.setdefault(self._years[row], []).append(entry)
+
+        return
+
+    def _rank(self, key: str, score: float, year: int) -> None:
+        if np.isnan(score):
+            return
+
+        entry = (-float(score), key)
+        insort(self._ranking, entry)
+        insort(self._year_rankings.setdefault(year, []), entry)
+
+        return
+
+    def _unrank(self, key: str, score: float, year: int) -> None:
+        if np.isnan(score):
+            return
+
+        entry = (-float(score), key)
+        for ranking in (self._ranking, self._year_rankings[year]):
+            position = bisect_left(ranking, entry)
+            del ranking[position]
+
+        return
+
+    @staticmethod
+    def _percentiles(total: int) -> np.ndarray:
+        # Share of the other scored movies ranked below each position
+        if total <= 1:
+            return np.full(total, 100.0)
+
+        return (total - 1 - np.arange(total)) / (total - 1) * 100.0
@@ -0,0 +1,301 @@
+import json
+import math
+from hashlib import blake2b
+from typing import Any, Dict, List, Optional
+
+from batch import RecordBatch
+from models import Movie, movie_key
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16")
+
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+        return
+
+    def add(self, value: str) -> None:
+        # blake2b instead of hash() so sketches built by other processes
+        # can be merged
+        hashed = int.from_bytes(
+            blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        register = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+        return
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+
+        self.registers = bytearray(max(a, b) for a, b
+                                   in zip(self.registers, other.registers))
+
+        return
+
+    def count(self) -> int:
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -rank
+                                             for rank in self.registers)
+
+        # Linear counting is more accurate for small cardinalities
+        empty = self.registers.count(0)
+        if estimate <= 2.5 * size and empty:
+            estimate = size * math.log(size / empty)
+
+        return int(round(estimate))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'precision': self.precision, 'registers': self.registers.hex()}
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> 'HyperLogLog':
+        sketch = cls(raw['precision'])
+        sketch.registers = bytearray.fromhex(raw['registers'])
+
+        return sketch
+
+
+class DDSketch:
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("DDSketch relative accuracy must be between 0 and 1")
+
+        # Values are counted in buckets whose bounds grow by a factor gamma,
+        # so a quantile is within relative_accuracy of its true value. The
+        # buckets are plain counts, so a value can be taken out again.
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+
+        return
+
+    def add(self, value: float) -> None:
+        self._update(value, 1)
+
+        return
+
+    def remove(self, value: float) -> None:
+        self._update(value, -1)
+
+        return
+
+    def merge(self, other: 'DDSketch') -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+
+        for store, other_store in ((self.positive, other.positive),
+                                   (self.negative, other.negative)):
+            for index, count in other_store.items():
+                store[index] = store.get(index, 0) + count
+
+        self.zeros += other.zeros
+        self.count += other.count
+
+        return
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+
+        rank = min(max(q, 0.0), 1.0) * (self.count - 1)
+
+        # Negative values first, the largest bucket index holds the smallest
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return -self._bucket_value(index)
+
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+
+        value = 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            value = self._bucket_value(index)
+            if seen > rank:
+                break
+
+        return value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'relative_accuracy': self.relative_accuracy,
+                'zeros': self.zeros,
+                'positive': {str(index): count for index, count
+                             in self.positive.items()},
+                'negative': {str(index): count for index, count
+                             in self.negative.items()}}
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> 'DDSketch':
+        sketch = cls(raw['relative_accuracy'])
+        sketch.zeros = raw['zeros']
+        sketch.positive = {int(index): count for index, count
+                           in raw['positive'].items()}
+        sketch.negative = {int(index): count for index, count
+                           in raw['negative'].items()}
+        sketch.count = sketch.zeros + sum(sketch.positive.values()) \
+            + sum(sketch.negative.values())
+
+        return sketch
+
+    def _update(self, value: float, count: int) -> None:
+        # A value that was never counted is not taken out
+        if value == 0:
+            if self.zeros + count >= 0:
+                self.zeros += count
+                self.count += count
+            return
+
+        store = self.positive if value > 0 else self.negative
+        index = int(math.ceil(math.log(abs(value)) / self._log_gamma))
+        total = store.get(index, 0) + count
+        if total < 0:
+            return
+
+        if total:
+            store[index] = total
+        else:
+            del store[index]
+        self.count += count
+
+        return
+
+    def _bucket_value(self, index: int) -> float:
+        # Bucket index holds the values in (gamma^(index-1), gamma^index],
+        # this value is within relative_accuracy of all of them
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+
+QUANTILE_FIELDS = [
+    'critic_score_pct',
+    'audience_avg_score',
+    'domestic_box_office',
+    'intl_box_office'
+]
+
+
+class CatalogStats:
+    def __init__(self, precision: int = 12, relative_accuracy: float = 0.01):
+        self.precision = precision
+        self.relative_accuracy = relative_accuracy
+        self.rows = 0
+        self.titles = HyperLogLog(precision)
+        self.titles_per_year: Dict[int, HyperLogLog] = {}
+        self.quantiles: Dict[str, DDSketch] = {
+            name: DDSketch(relative_accuracy) for name in QUANTILE_FIELDS
+        }
+
+        return
+
+    def update_batch(self, batch: RecordBatch, fields: Dict[str, str]) -> None:
+        columns = {movie_field: batch.column(column)
+                   for column, movie_field in fields.items()}
+
+        for title, year in zip(columns['title'], columns['year']):
+            key = movie_key(title, year)
+            self.titles.add(key)
+            if year not in self.titles_per_year:
+                self.titles_per_year[year] = HyperLogLog(self.precision)
+            self.titles_per_year[year].add(key)
+
+        self.rows += batch.length
+
+        return
+
+    def update_field(self, name: str, old: Any, new: Any) -> None:
+        # Quantiles are taken over the merged value of every movie, not the
+        # provider rows: called with every change of a merged value, the old
+        # value is taken out and the new one counted. A movie sent by several
+        # providers, or ingested again, is counted once.
+        sketch = self.quantiles.get(name)
+        if sketch is None:
+            return
+
+        if old is not None:
+            sketch.remove(old)
+        if new is not None:
+            sketch.add(new)
+
+        return
+
+    def add_movies(self, movies: List[Movie]) -> None:
+        # Counts the values of movies merged before the stats were kept
+        for movie in movies:
+            for name in self.quantiles:
+                self.update_field(name, None, getattr(movie, name))
+
+        return
+
+    def merge(self, other: 'CatalogStats') -> None:
+        # The quantiles of shards holding different movies add up, as with
+        # shards split by movie key. A movie in both shards counts twice.
+        self.rows += other.rows
+        self.titles.merge(other.titles)
+
+        for year, sketch in other.titles_per_year.items():
+            if year not in self.titles_per_year:
+                self.titles_per_year[year] = HyperLogLog(self.precision)
+            self.titles_per_year[year].merge(sketch)
+
+        for name, sketch in other.quantiles.items():
+            self.quantiles.setdefault(
+                name, DDSketch(self.relative_accuracy)).merge(sketch)
+
+        return
+
+    def distinct_titles(self, year: Optional[int] = None) -> int:
+        if year is None:
+            return self.titles.count()
+
+        sketch = self.titles_per_year.get(year)
+
+        return sketch.count() if sketch is not None else 0
+
+    def quantile(self, name: str, q: float) -> Optional[float]:
+        return self.quantiles[name].quantile(q)
+
+    def save(self, path: str) -> None:
+        with open(path, 'w') as fp:
+            json.dump({
+                'precision': self.precision,
+                'relative_accuracy': self.relative_accuracy,
+                'rows': self.rows,
+                'titles': self.titles.to_dict(),
+                'titles_per_year': {str(year): sketch.to_dict() for year, sketch
+                                    in self.titles_per_year.items()},
+                'quantiles': {name: sketch.to_dict() for name, sketch
+                              in self.quantiles.items()}
+            }, fp)
+
+        return
+
+    @classmethod
+    def load(cls, path: str) -> 'CatalogStats':
+        with open(path, 'r') as fp:
+            raw = json.load(fp)
+
+        stats = cls(raw['precision'], raw['relative_accuracy'])
+        stats.rows = raw['rows']
+        stats.titles = HyperLogLog.from_dict(raw['titles'])
+        stats.titles_per_year = {int(year): HyperLogLog.from_dict(sketch)
+                                 for year, sketch
+                                 in raw['titles_per_year'].items()}
+        stats.quantiles = {name: DDSketch.from_dict(sketch)
+                           for name, sketch in raw['quantiles'].items()}
+
+        return stats
@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+from changes import INSERT, UPDATE
+from exporters import write_delta
+from models import Movie
+from repository import MovieRepository
+
+
+def tracked_repository() -> MovieRepository:
+    repo = MovieRepository()
+    repo.changes.enable()
+
+    return repo
+
+
+class TestChangeTracking:
+    def test_new_movie_is_an_insert(self):
+        repo = tracked_repository()
+
+        repo.add_update(Movie(title="Test", year=2020, critic_score_pct=85))
+
+        changes = repo.changes.changes()
+        assert len(changes) == 1
+        assert changes[0].op == INSERT
+        assert changes[0].title == "Test"
+        assert changes[0].fields['critic_score_pct'] == (None, 85)
+
+    def test_only_changed_fields_are_recorded(self):
+        repo = tracked_repository()
+        repo.add_update(Movie(title="Test", year=2020, critic_score_pct=85,
+                              audience_avg_score=8.0))
+        repo.changes.drain()
+
+        repo.add_update(Movie(title="Test", year=2020, critic_score_pct=85,
+                              audience_avg_score=9.0), 'audience', 1)
+
+        changes = repo.changes.changes()
+        assert changes[0].op == UPDATE
+        assert changes[0].fields == {'audience_avg_score': (8.0, 9.0)}
+
+    def test_unchanged_movie_is_not_recorded(self):
+        repo = tracked_repository()
+        repo.add_update(Movie(title="Test", year=2020, critic_score_pct=85))
+        repo.changes.drain()
+
+        repo.add_update(Movie(title="Test", year=2020, critic_score_pct=85))
+
+        assert len(repo.changes) == 0
+
+    def test_updates_are_coalesced(self):
+        repo = tracked_repository()
+        repo.add_update(Movie(title="Test", year=2020, critic_score_pct=85))
+        repo.changes.drain()
+
+        repo.add_update(Movie(title="Test", year=2020, critic_score_pct=90), 'a', 1)
+        repo.add_update(Movie(title="Test", year=2020, critic_score_pct=95), 'b', 2)
+
+        assert repo.changes.changes()[0].fields == {'critic_score_pct': (85, 95)}
+
+    def test_disabled_log_only_counts_movies(self):
+        repo = MovieRepository()
+        keys = []
+        repo.changes.subscribe(keys.append)
+
+        repo.add_update(Movie(title="Test", year=2020, critic_score_pct=85))
+        repo.add_update(Movie(title="Other", year=2020, critic_score_pct=70))
+
+        assert len(repo.changes) == 2
+        assert repo.changes.changes() == []
+        assert set(keys) == {"test_2020", "other_2020"}
+
+    def test_loaded_catalog_keeps_merge_state(self, tmp_path):
+        catalog = str(tmp_path / "catalog.json")
+        repo = tracked_repository()
+        repo.add_update(Movie(title="Test", year=2020, critic_score_pct=85),
+                        'critic', 3)
+        repo.save(catalog)
+
+        loaded = MovieRepository.load(catalog)
+        loaded.add_update(Movie(title="Test", year=2020, critic_score_pct=10),
+                          'other', 1)
+
+        assert len(loaded.changes) == 0
+        assert loaded.search("Test", 2020).critic_score_pct == 85
+
+
+class TestDeltaExport:
+    def test_write_jsonl(self, tmp_path):
+        repo = tracked_repository()
+        repo.add_update(Movie(title="Test", year=2020, critic_score_pct=85))
+        output = tmp_path / "delta.jsonl"
+
+        assert write_delta(repo.changes.drain(), str(output)) == 1
+
+        lines = output.read_text().splitlines()
+        assert json.loads(lines[0])['fields']['critic_score_pct'] == \
+            {'old': None, 'new': 85}
+
+    def test_write_parquet(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        repo = tracked_repository()
+        repo.add_update(Movie(title="Test", year=2020, critic_score_pct=85))
+        output = tmp_path / "delta.parquet"
+
+        write_delta(repo.changes.drain(), str(output))
+
+        table = pq.read_table(str(output)).to_pylist()
+        assert {'field': 'critic_score_pct', 'new': '85'}.items() <= \
+            next(row for row in table if row['field'] == 'critic_score_pct').items()
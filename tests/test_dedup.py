@@ -0,0 +1,234 @@
+import pytest
+
+from batch import RecordBatch
+from dedup import BloomFilter, RowFilter, row_fingerprints
+from pipeline import MovieDataPipeline
+from registry import load_pipeline_spec
+from repository import MovieRepository
+
+
+KEY_COLUMNS = ('movie_title', 'release_year')
+
+
+def critic_batch(rows) -> RecordBatch:
+    names = ['movie_title', 'release_year', 'critic_score_pct',
+             'top_critic_score', 'total_critic_reviews_counted']
+
+    return RecordBatch(columns={name: [row[i] for row in rows]
+                                for i, name in enumerate(names)},
+                       length=len(rows), lazy=['movie_title'])
+
+
+class TestRowFingerprints:
+    def test_bytes_and_text_match(self) -> None:
+        raw = row_fingerprints('critic', [[b'Inception'], [2010]])
+        text = row_fingerprints('critic', [['Inception'], [2010]])
+
+        assert raw == text
+
+        return
+
+    def test_provider_is_part_of_fingerprint(self) -> None:
+        critic = row_fingerprints('critic', [['Inception'], [2010]])
+        audience = row_fingerprints('audience', [['Inception'], [2010]])
+
+        assert critic != audience
+
+        return
+
+
+class TestRowFilter:
+    @pytest.mark.parametrize("mode", ['bloom', 'exact'])
+    def test_repeated_rows_are_skipped(self, mode) -> None:
+        row_filter = RowFilter(mode)
+        rows = [(b'Inception', 2010, 87, 8.1, 450),
+                (b'Parasite', 2019, 99, 9.2, 400)]
+
+        first = row_filter.filter_batch(critic_batch(rows), 'critic',
+                                        KEY_COLUMNS)
+        row_filter.record_merge(first, 0.1)
+        second = row_filter.filter_batch(
+            critic_batch(rows + [(b'Inception', 2010, 88, 8.1, 451)]),
+            'critic', KEY_COLUMNS)
+
+        assert first.batch.length == 2
+        assert second.batch.length == 1
+        assert second.batch.column('critic_score_pct') == [88]
+        assert second.batch.lazy == ['movie_title']
+        assert row_filter.skipped == 2
+        assert row_filter.skipped_fraction() == 0.4
+
+        return
+
+    @pytest.mark.parametrize("mode", ['bloom', 'exact'])
+    def test_repeats_inside_a_batch(self, mode) -> None:
+        row_filter = RowFilter(mode)
+        row = (b'Inception', 2010, 87, 8.1, 450)
+
+        filtered = row_filter.filter_batch(critic_batch([row, row, row]),
+                                           'critic', KEY_COLUMNS)
+
+        assert filtered.batch.length == 1
+
+        return
+
+    @pytest.mark.parametrize("mode", ['bloom', 'exact'])
+    def test_rows_are_added_once_merged(self, mode) -> None:
+        row_filter = RowFilter(mode)
+        rows = [(b'Inception', 2010, 87, 8.1, 450)]
+
+        row_filter.filter_batch(critic_batch(rows), 'critic', KEY_COLUMNS)
+        filtered = row_filter.filter_batch(critic_batch(rows), 'critic',
+                                           KEY_COLUMNS)
+
+        assert filtered.batch.length == 1
+        assert row_filter.merged_rows == 0
+
+        return
+
+    def test_only_a_repeat_of_the_last_row_is_skipped(self) -> None:
+        row_filter = RowFilter('exact')
+        drops = [(b'Inception', 2010, 100, 8.1, 450),
+                 (b'Inception', 2010, 90, 8.1, 450),
+                 (b'INCEPTION', 2010, 90, 8.1, 450),
+                 (b'Inception', 2010, 100, 8.1, 450),
+                 (b'Inception', 2010, 100, 8.1, 450)]
+
+        kept = []
+        for row in drops:
+            filtered = row_filter.filter_batch(critic_batch([row]), 'critic',
+                                               KEY_COLUMNS)
+            row_filter.record_merge(filtered, 0.1)
+            kept.append(filtered.batch.length)
+
+        assert kept == [1, 1, 1, 1, 0]
+        assert len(row_filter.latest) == 1
+
+        return
+
+    def test_bloom_grows_past_capacity(self) -> None:
+        row_filter = RowFilter('bloom', error_rate=0.01, capacity=1000)
+        fingerprints = row_fingerprints('critic', [list(range(20000))])
+
+        new = row_filter.new_rows(fingerprints)
+        row_filter.add([fingerprints[row] for row in new])
+
+        assert len(row_filter.blooms) > 1
+        assert all(bloom.count <= bloom.capacity for bloom in row_filter.blooms)
+        assert len(new) == len(fingerprints)
+        assert row_filter.new_rows(fingerprints) == []
+
+        others = row_fingerprints('critic', [list(range(20000, 40000))])
+        assert len(others) - len(row_filter.new_rows(others)) <= \
+            len(others) * 0.01
+
+        return
+
+    def test_unknown_mode(self) -> None:
+        with pytest.raises(ValueError):
+            RowFilter('cuckoo')
+
+        return
+
+    @pytest.mark.parametrize("mode", ['bloom', 'exact'])
+    def test_save_and_load(self, mode, tmp_path) -> None:
+        row_filter = RowFilter(mode, capacity=1000)
+        rows = [(b'Inception', 2010, 87, 8.1, 450)]
+        row_filter.record_merge(
+            row_filter.filter_batch(critic_batch(rows), 'critic', KEY_COLUMNS),
+            0.5)
+        row_filter.save(str(tmp_path / "dedup.json"))
+
+        loaded = RowFilter.load(str(tmp_path / "dedup.json"))
+        filtered = loaded.filter_batch(critic_batch(rows), 'critic',
+                                       KEY_COLUMNS)
+
+        assert loaded.mode == mode
+        assert filtered.batch.length == 0
+        assert loaded.time_saved() == pytest.approx(0.5 - loaded.filter_time)
+
+        return
+
+
+class TestBloomFilter:
+    def test_sizing(self) -> None:
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+
+        assert bloom.size == 9586
+        assert bloom.hashes == 7
+
+        return
+
+    def test_invalid_error_rate(self) -> None:
+        with pytest.raises(ValueError):
+            BloomFilter(error_rate=1.5)
+
+        return
+
+
+class TestPipelineDedup:
+    def test_second_ingest_skips_repeated_rows(self) -> None:
+        spec = load_pipeline_spec()
+        registry = spec.registry()
+        row_filter = RowFilter('exact')
+        repository = MovieRepository(spec.merge_policy())
+        pipeline = MovieDataPipeline(repository, registry,
+                                     row_filter=row_filter)
+
+        pipeline.run(registry.build_readers(spec.data_dir))
+        first_rows = row_filter.rows
+        pipeline.run(registry.build_readers(spec.data_dir))
+
+        assert row_filter.skipped == first_rows
+        assert row_filter.merged_rows == first_rows
+        assert repository.search("Inception", 2010).critic_score_pct == 87
+
+        return
+
+    def test_rows_of_a_failed_batch_are_ingested_again(self, tmp_path) -> None:
+        spec = load_pipeline_spec()
+        registry = spec.registry()
+        critic = registry.get('critic')
+        row_filter = RowFilter('exact')
+        repository = MovieRepository(spec.merge_policy())
+        pipeline = MovieDataPipeline(repository, registry,
+                                     row_filter=row_filter)
+        drop_file = tmp_path / "critic_aggregator.csv"
+        header = (b"movie_title,release_year,critic_score_percentage,"
+                  b"top_critic_score,total_critic_reviews_counted\n")
+
+        drop_file.write_bytes(header + b"Good Movie,2020,80,7.0,100\n"
+                              b"Bad \xff Movie,2020,60,6.0,90\n")
+        with pytest.raises(UnicodeDecodeError):
+            pipeline.run({'critic': critic.build_file_reader('file_path',
+                                                             drop_file)})
+
+        drop_file.write_bytes(header + b"Good Movie,2020,80,7.0,100\n"
+                              b"Bad Movie,2020,60,6.0,90\n")
+        pipeline.run({'critic': critic.build_file_reader('file_path',
+                                                         drop_file)})
+
+        assert repository.search("Good Movie", 2020).critic_score_pct == 80
+        assert repository.search("Bad Movie", 2020).critic_score_pct == 60
+
+        return
+
+    def test_resent_row_after_a_correction_is_merged(self, tmp_path) -> None:
+        spec = load_pipeline_spec()
+        registry = spec.registry()
+        critic = registry.get('critic')
+        repository = MovieRepository(spec.merge_policy())
+        pipeline = MovieDataPipeline(repository, registry,
+                                     row_filter=RowFilter('exact'))
+        drop_file = tmp_path / "critic_aggregator.csv"
+        header = ("movie_title,release_year,critic_score_percentage,"
+                  "top_critic_score,total_critic_reviews_counted\n")
+
+        for score in (100, 90, 100):
+            drop_file.write_text(header + f"Movie A,2020,{score},7.0,100\n")
+            pipeline.run({'critic': critic.build_file_reader('file_path',
+                                                             drop_file)})
+
+        assert repository.search("Movie A", 2020).critic_score_pct == 100
+
+        return
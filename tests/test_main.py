@@ -0,0 +1,184 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import main
+from models import Movie
+from repository import MovieRepository
+from registry import ProviderSpec, default_registry
+from readers.critic_agg import CriticAggReader
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class TestProviderRegistry:
+    def test_build_reader_resolves_paths(self) -> None:
+        registry = default_registry()
+
+        readers = registry.build_readers(Path("data"), ['critic'])
+
+        assert list(readers) == ['critic']
+        assert isinstance(readers['critic'], CriticAggReader)
+        assert readers['critic'].file_path == Path("data/critic_aggregator.csv")
+
+        return
+
+    def test_load_reader_class(self) -> None:
+        spec = ProviderSpec(name='critic',
+                            reader='readers.critic_agg:CriticAggReader')
+
+        assert spec.load_reader_class() is CriticAggReader
+
+        return
+
+
+class TestCli:
+    def test_ingest_then_query(self, tmp_path, capsys) -> None:
+        catalog = str(tmp_path / "catalog.json")
+
+        assert main.main(["--catalog", catalog, "ingest"]) == 0
+        assert main.main(["--catalog", catalog, "query", "Inception", "2010"]) == 0
+
+        output = capsys.readouterr().out
+        assert "Inception (2010)" in output
+        assert "ROI: 218.6%" in output
+
+        return
+
+    def test_incremental_ingest_skips_repeated_rows(self, tmp_path,
+                                                    capsys) -> None:
+        catalog = str(tmp_path / "catalog.json")
+
+        assert main.main(["--catalog", catalog, "ingest", "--dedup", "exact"]) == 0
+        assert main.main(["--catalog", catalog, "ingest", "--dedup", "exact",
+                          "--incremental"]) == 0
+
+        output = capsys.readouterr().out
+        assert "Duplicate rows skipped: 0 of 8 (0.0%)" in output
+        assert "Duplicate rows skipped: 8 of 8 (100.0%)" in output
+        assert (tmp_path / "catalog.dedup.json").exists()
+
+        return
+
+    def test_saved_filter_needs_its_catalog(self, tmp_path, capsys) -> None:
+        catalog = tmp_path / "catalog.json"
+
+        assert main.main(["--catalog", str(catalog), "ingest",
+                          "--dedup", "exact"]) == 0
+        catalog.unlink()
+        assert main.main(["--catalog", str(catalog), "ingest",
+                          "--dedup", "exact", "--incremental"]) == 0
+
+        output = capsys.readouterr().out
+        assert "Duplicate rows skipped: 8 of 8" not in output
+        assert MovieRepository.load(str(catalog)).search("Inception",
+                                                        2010) is not None
+        assert main.main(["--catalog", str(catalog), "stats"]) == 0
+        assert "Rows ingested: 8" in capsys.readouterr().out
+
+        return
+
+    def test_delta_out_merges_into_saved_catalog(self, tmp_path,
+                                                 capsys) -> None:
+        catalog = str(tmp_path / "catalog.json")
+        delta = tmp_path / "delta.jsonl"
+
+        assert main.main(["--catalog", catalog, "ingest", "--dedup", "off"]) == 0
+        assert main.main(["--catalog", catalog, "ingest", "--dedup", "off",
+                          "--delta-out", str(delta)]) == 0
+
+        assert "Delta with 0 changed movies" in capsys.readouterr().out
+        assert delta.read_text() == ""
+
+        return
+
+    def test_changed_dedup_settings_rebuild_the_filter(self, tmp_path,
+                                                       capsys) -> None:
+        catalog = str(tmp_path / "catalog.json")
+        spec_file = tmp_path / "pipeline.json"
+        raw_spec = json.loads((ROOT / "pipeline.json").read_text())
+        raw_spec['data_dir'] = str(ROOT / "data")
+        raw_spec['dedup'] = {'mode': 'bloom', 'error_rate': 0.001}
+        spec_file.write_text(json.dumps(raw_spec))
+
+        assert main.main(["--catalog", catalog, "ingest",
+                          "--spec", str(spec_file)]) == 0
+
+        raw_spec['dedup']['error_rate'] = 0.0001
+        spec_file.write_text(json.dumps(raw_spec))
+        assert main.main(["--catalog", catalog, "ingest", "--incremental",
+                          "--spec", str(spec_file)]) == 0
+
+        output = capsys.readouterr().out
+        assert "Dedup settings changed" in output
+        assert "Duplicate rows skipped: 0 of 8" in output
+
+        return
+
+    def test_stats_without_ingest(self, tmp_path, capsys) -> None:
+        catalog = str(tmp_path / "catalog.json")
+
+        assert main.main(["--catalog", catalog, "stats"]) == 1
+        assert "run ingest first" in capsys.readouterr().out
+
+        return
+
+    @pytest.mark.parametrize("command", [["query", "Test"], ["top"],
+                                         ["export", "movies.jsonl"]])
+    def test_commands_without_catalog(self, command, tmp_path,
+                                      capsys) -> None:
+        catalog = str(tmp_path / "catalog.json")
+
+        assert main.main(["--catalog", catalog] + command) == 1
+        assert f"No catalog found at {catalog}, run ingest first" in \
+            capsys.readouterr().out
+
+        return
+
+    def test_query_missing_movie(self, tmp_path) -> None:
+        catalog = str(tmp_path / "catalog.json")
+        repository = MovieRepository()
+        repository.add_update(Movie(title="Test", year=2020))
+        repository.save(catalog)
+
+        assert main.main(["--catalog", catalog, "query", "Other", "2020"]) == 1
+
+        return
+
+    def test_query_does_not_import_readers(self, tmp_path) -> None:
+        catalog = str(tmp_path / "catalog.json")
+        repository = MovieRepository()
+        repository.add_update(Movie(title="Test", year=2020))
+        repository.save(catalog)
+
+        script = (
+            "import sys, main; "
+            f"main.main(['--timings', '--catalog', {catalog!r}, 'query', 'Test', '2020']); "
+            "print(sorted(m for m in sys.modules if m.startswith('readers.')))"
+        )
+        result = subprocess.run([sys.executable, "-c", script], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+
+        assert result.stdout.strip().endswith("[]")
+        assert "Startup time:" in result.stderr
+
+        return
+
+    def test_ingest_without_dedup_does_not_import_numpy(self, tmp_path) -> None:
+        catalog = str(tmp_path / "catalog.json")
+
+        script = (
+            "import sys, main; "
+            f"main.main(['--catalog', {catalog!r}, 'ingest', '--dedup', 'off']); "
+            "print('numpy' in sys.modules)"
+        )
+        result = subprocess.run([sys.executable, "-c", script], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+
+        assert result.stdout.strip().endswith("False")
+
+        return
@@ -0,0 +1,159 @@
+import json
+from dataclasses import asdict
+
+import pytest
+from hypothesis import given, strategies as st
+
+from merge import POLICIES, FieldPolicy, FieldValue, MergePolicy
+from models import Movie
+from pipeline import MovieDataPipeline
+from registry import load_pipeline_spec
+from repository import MovieRepository
+
+
+PROVIDERS = {'box_office': 1, 'audience': 2, 'critic': 3}
+
+field_values = st.builds(
+    FieldValue,
+    value=st.integers(min_value=0, max_value=1000),
+    priority=st.tuples(st.integers(0, 2), st.integers(0, 3)),
+    timestamp=st.sampled_from([0.0, 1.0, 2.0])
+)
+
+records = st.lists(st.fixed_dictionaries({
+    'provider': st.sampled_from(sorted(PROVIDERS)),
+    'timestamp': st.sampled_from([0.0, 10.0, 20.0]),
+    'movie': st.builds(
+        Movie,
+        title=st.sampled_from(["Inception", "inception", "Parasite"]),
+        year=st.sampled_from([2010, 2019]),
+        critic_score_pct=st.none() | st.integers(0, 100),
+        audience_avg_score=st.none() | st.floats(0, 10, allow_nan=False),
+        tot_audience_ratings=st.none() | st.integers(0, 10 ** 6),
+        domestic_box_office=st.none() | st.integers(0, 10 ** 9),
+        intl_box_office=st.none() | st.integers(0, 10 ** 9)
+    )
+}), max_size=20)
+
+
+def build_policy() -> MergePolicy:
+    return MergePolicy(fields={
+        'domestic_box_office': FieldPolicy('priority', ['box_office', 'audience']),
+        'audience_avg_score': FieldPolicy('newest'),
+        'critic_score_pct': FieldPolicy('max'),
+        'intl_box_office': FieldPolicy('min'),
+        'tot_audience_ratings': FieldPolicy('sum')
+    })
+
+
+def ingest(items) -> MovieRepository:
+    repository = MovieRepository(build_policy())
+    for item in items:
+        repository.add_update(item['movie'], item['provider'],
+                              PROVIDERS[item['provider']], item['timestamp'])
+
+    return repository
+
+
+def snapshot(repository: MovieRepository) -> dict:
+    return {movie.get_movie_key(): asdict(movie)
+            for movie in repository.search_all()}
+
+
+class TestPolicies:
+    @pytest.mark.parametrize("policy", sorted(POLICIES))
+    @given(a=field_values, b=field_values)
+    def test_commutative(self, policy, a, b):
+        merge = POLICIES[policy]
+
+        assert merge(a, b) == merge(b, a)
+
+    @pytest.mark.parametrize("policy", sorted(POLICIES))
+    @given(a=field_values, b=field_values, c=field_values)
+    def test_associative(self, policy, a, b, c):
+        merge = POLICIES[policy]
+
+        assert merge(merge(a, b), c) == merge(a, merge(b, c))
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError):
+            FieldPolicy('average')
+
+    def test_field_provider_order_beats_precedence(self):
+        policy = build_policy()
+
+        box_office = policy.priority('box_office', 1, 'domestic_box_office')
+        audience = policy.priority('audience', 2, 'domestic_box_office')
+
+        assert box_office > audience
+        assert policy.priority('box_office', 1, 'prd_budget') < \
+            policy.priority('audience', 2, 'prd_budget')
+
+
+class TestOrderIndependentMerge:
+    @given(items=records, data=st.data())
+    def test_any_order_gives_same_catalog(self, items, data):
+        shuffled = data.draw(st.permutations(items))
+
+        assert snapshot(ingest(items)) == snapshot(ingest(shuffled))
+
+    @given(items=records, data=st.data())
+    def test_merged_shards_give_same_catalog(self, items, data):
+        shard_ids = data.draw(st.lists(st.integers(0, 3), min_size=len(items),
+                                       max_size=len(items)))
+        shards = [ingest([item for item, shard in zip(items, shard_ids)
+                          if shard == shard_id]) for shard_id in range(4)]
+
+        merged = MovieRepository(build_policy())
+        for shard in data.draw(st.permutations(shards)):
+            merged.merge(shard)
+
+        assert snapshot(merged) == snapshot(ingest(items))
+
+    def test_box_office_wins_domestic_gross(self):
+        repository = ingest([
+            {'provider': 'box_office', 'timestamp': 0.0,
+             'movie': Movie(title="Inception", year=2010,
+                            domestic_box_office=292576195)},
+            {'provider': 'audience', 'timestamp': 0.0,
+             'movie': Movie(title="Inception", year=2010,
+                            domestic_box_office=292587330)}
+        ])
+
+        movie = repository.search("Inception", 2010)
+        assert movie.domestic_box_office == 292576195
+
+
+class TestProviderCorrections:
+    def test_later_drop_can_lower_a_value(self):
+        repository = MovieRepository()
+        repository.add_update(Movie(title="Inception", year=2010,
+                                    audience_avg_score=8.5), 'audience', 2)
+        repository.add_update(Movie(title="Inception", year=2010,
+                                    audience_avg_score=8.3), 'audience', 2)
+
+        assert repository.search("Inception", 2010).audience_avg_score == 8.3
+
+    def test_correction_across_two_runs(self, tmp_path):
+        spec = load_pipeline_spec()
+        registry = spec.registry()
+        catalog = str(tmp_path / "catalog.json")
+        drop_file = tmp_path / "audience_pulse.json"
+
+        def run(repository, score):
+            drop_file.write_text(json.dumps([{
+                "title": "Inception", "year": "2010",
+                "audience_average_score": score,
+                "total_audience_ratings": 1500000,
+                "domestic_box_office_gross": 292576195
+            }]))
+            MovieDataPipeline(repository, registry).run(
+                registry.build_readers(tmp_path, ['audience']))
+            repository.save(catalog)
+
+        run(MovieRepository(spec.merge_policy()), 9.1)
+        repository = MovieRepository.load(catalog, spec.merge_policy())
+        run(repository, 8.7)
+
+        movie = MovieRepository.load(catalog).search("Inception", 2010)
+        assert movie.audience_avg_score == 8.7
@@ -1,10 +1,41 @@
 import pytest
+from types import SimpleNamespace
 from unittest.mock import Mock
 
 from models import Movie, CriticData, AudienceData, BoxOfficeData
 from repository import MovieRepository
-from pipeline import MovieDataPipeline
-from readers.base import DataReader
+from pipeline import PREFETCH_BATCHES, MovieDataPipeline
+from readers.base import BatchReader, DataReader
+from registry import ProviderRegistry, ProviderSpec, load_pipeline_spec
+from dag import Stage, run_stages
+from batch import RecordBatch, chunk_columns
+
+
+class CountingReader(BatchReader):
+    # Yields one movie per batch and records how many batches were read
+    # ahead of the repository when each batch was yielded
+    def __init__(self, repository, batches, fail_at=None):
+        self.repository = repository
+        self.batches = batches
+        self.fail_at = fail_at
+        self.leads = []
+
+    def read(self):
+        return []
+
+    def read_batches(self, chunk_size=1024):
+        for number in range(self.batches):
+            if number == self.fail_at:
+                raise ValueError("Broken provider file")
+
+            self.leads.append(number - self.repository.count())
+            yield RecordBatch(columns={
+                'movie_title': [f"Movie {number}"],
+                'release_year': [2020],
+                'critic_score_pct': [80],
+                'top_critic_score': [8.0],
+                'total_critic_reviews_counted': [100]
+            }, length=1)
 
 
 class TestMovieRepository:
@@ -169,6 +200,65 @@ class TestMovieDataPipeline:
         assert movie.domestic_box_office == 100000000
 
 
+class TestRecordBatches:
+    def test_apply_batch_merges_columns(self):
+        repo = MovieRepository()
+        batch = RecordBatch(columns={
+            'name': ["Movie", "Other"],
+            'year': [2020, 2021],
+            'score': [7.5, None]
+        }, length=2)
+
+        repo.apply_batch(batch, {'name': 'title', 'year': 'year',
+                                 'score': 'audience_avg_score'})
+
+        assert repo.count() == 2
+        assert repo.search("Movie", 2020).audience_avg_score == 7.5
+        assert repo.search("Other", 2021).audience_avg_score is None
+
+    def test_record_readers_are_chunked(self):
+        repo = MovieRepository()
+        pipeline = MovieDataPipeline(repo, chunk_size=2)
+
+        mock_reader = Mock(spec=DataReader)
+        mock_reader.read.return_value = [
+            CriticData(f"Movie {number}", 2020, 85, 8.5, 100)
+            for number in range(5)
+        ]
+
+        batches = list(pipeline.read_batches(
+            pipeline.registry.get('critic'), mock_reader))
+        pipeline.process_critic_data(mock_reader)
+
+        assert [batch.length for batch in batches] == [2, 2, 1]
+        assert repo.count() == 5
+
+    @pytest.mark.parametrize("parallelism", [1, 3])
+    def test_batches_are_merged_while_reading(self, parallelism):
+        repo = MovieRepository()
+        pipeline = MovieDataPipeline(repo, parallelism=parallelism)
+        reader = CountingReader(repo, 50)
+
+        pipeline.run({'critic': reader})
+
+        assert repo.count() == 50
+        assert max(reader.leads) <= PREFETCH_BATCHES + 2
+
+    def test_reader_errors_stop_the_run(self):
+        repo = MovieRepository()
+        pipeline = MovieDataPipeline(repo, parallelism=2)
+
+        with pytest.raises(ValueError, match="Broken provider file"):
+            pipeline.run({'critic': CountingReader(repo, 50, fail_at=10)})
+
+    def test_chunk_columns(self):
+        batches = list(chunk_columns({'a': [1, 2, 3], 'b': [4, 5, 6]}, 2))
+
+        assert [batch.columns for batch in batches] == [
+            {'a': [1, 2], 'b': [4, 5]}, {'a': [3], 'b': [6]}
+        ]
+
+
 class TestIntegration:
     def test_three_providers_full_system(self):
         repo = MovieRepository()
@@ -209,3 +299,102 @@ class TestIntegration:
         parasite = repo.search("Parasite", 2019)
         assert parasite.critic_score_pct == 99
         assert parasite.audience_avg_score == 9.0
+
+
+class TestPipelineSpec:
+    def test_load_default_spec(self):
+        spec = load_pipeline_spec()
+
+        assert spec.registry().names() == ['box_office', 'audience', 'critic']
+        assert spec.registry().get('critic').fields['movie_title'] == 'title'
+
+    def test_load_toml_spec(self, tmp_path):
+        spec_file = tmp_path / "pipeline.toml"
+        spec_file.write_text(
+            'parallelism = 2\n'
+            '[[providers]]\n'
+            'name = "critic"\n'
+            'reader = "readers.critic_agg:CriticAggReader"\n'
+            '[providers.options]\n'
+            'file_path = "critic_aggregator.csv"\n'
+        )
+
+        spec = load_pipeline_spec(str(spec_file))
+
+        assert spec.parallelism == 2
+        assert spec.providers[0].options == {'file_path': 'critic_aggregator.csv'}
+
+    def test_new_provider_without_code_changes(self):
+        registry = ProviderRegistry()
+        registry.register(ProviderSpec(
+            name='streaming',
+            reader='readers.critic_agg:CriticAggReader',
+            fields={'name': 'title', 'year': 'year', 'score': 'audience_avg_score'}
+        ))
+
+        repo = MovieRepository()
+        pipeline = MovieDataPipeline(repo, registry)
+
+        streaming_reader = Mock(spec=DataReader)
+        streaming_reader.read.return_value = [
+            SimpleNamespace(name="Movie", year=2020, score=7.5)
+        ]
+
+        pipeline.run({'streaming': streaming_reader})
+
+        assert repo.search("Movie", 2020).audience_avg_score == 7.5
+
+    def test_precedence_decides_merge_order(self):
+        registry = ProviderRegistry()
+        for name, precedence in [('low', 1), ('high', 2)]:
+            registry.register(ProviderSpec(
+                name=name,
+                reader='readers.critic_agg:CriticAggReader',
+                fields={'title': 'title', 'year': 'year',
+                        'gross': 'domestic_box_office'},
+                precedence=precedence
+            ))
+
+        high_reader = Mock(spec=DataReader)
+        high_reader.read.return_value = [
+            SimpleNamespace(title="Movie", year=2020, gross=200)
+        ]
+        low_reader = Mock(spec=DataReader)
+        low_reader.read.return_value = [
+            SimpleNamespace(title="Movie", year=2020, gross=100)
+        ]
+
+        repo = MovieRepository()
+        pipeline = MovieDataPipeline(repo, registry, parallelism=2)
+        pipeline.run({'high': high_reader, 'low': low_reader})
+
+        assert repo.search("Movie", 2020).domestic_box_office == 200
+
+
+class TestRunStages:
+    def test_dependencies_run_first(self):
+        order = []
+
+        stages = [
+            Stage("b", lambda results: order.append("b") or results["a"] + 1,
+                  depends_on=["a"]),
+            Stage("a", lambda results: order.append("a") or 1),
+        ]
+
+        results = run_stages(stages, max_workers=2)
+
+        assert order == ["a", "b"]
+        assert results["b"] == 2
+
+    def test_cycle_is_rejected(self):
+        stages = [
+            Stage("a", lambda results: None, depends_on=["b"]),
+            Stage("b", lambda results: None, depends_on=["a"]),
+        ]
+
+        with pytest.raises(ValueError):
+            run_stages(stages)
+
+    def test_unknown_dependency_is_rejected(self):
+        with pytest.raises(ValueError):
+            run_stages([Stage("a", lambda results: None, depends_on=["x"])])
@@ -7,6 +7,7 @@ from tempfile import TemporaryDirectory
 from readers.critic_agg import CriticAggReader
 from readers.audience_pulse import AudiencePulseReader
 from readers.box_office_metrics import BoxOfficeMetricsReader
+from readers import mmap_csv
 
 
 class TestCriticAggReader:
@@ -48,6 +49,76 @@ class TestCriticAggReader:
 
         return
 
+    def test_read_batches_in_chunks(self, tmp_path) -> None:
+        csv_file = tmp_path / "critic.csv"
+        with open(csv_file, 'w', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(['movie_title', 'release_year', 'critic_score_percentage', 
+                           'top_critic_score', 'total_critic_reviews_counted'])
+            for number in range(5):
+                writer.writerow([f'Movie {number}', '2020', '85', '8.5', '100'])
+
+        reader = CriticAggReader(str(csv_file))
+        batches = list(reader.read_batches(chunk_size=2))
+
+        assert [batch.length for batch in batches] == [2, 2, 1]
+        assert batches[2].column('movie_title') == ['Movie 4']
+        assert batches[0].column('release_year') == [2020, 2020]
+
+        return
+
+
+    @pytest.mark.parametrize("block_size", [1 << 20, 16])
+    def test_mmap_mode_matches_csv_mode(self, tmp_path, monkeypatch,
+                                        block_size) -> None:
+        monkeypatch.setattr(mmap_csv, 'BLOCK_SIZE', block_size)
+        csv_file = tmp_path / "critic.csv"
+        with open(csv_file, 'w', newline='') as fp:
+            writer = csv.writer(fp, lineterminator='\r\n')
+            writer.writerow(['movie_title', 'release_year', 'critic_score_percentage', 
+                           'top_critic_score', 'total_critic_reviews_counted'])
+            writer.writerow(['Test Movie', '2020', '85', '8.5', '100'])
+            writer.writerow(['Crouching Tiger, Hidden Dragon', '2000', '97', '8.7', '160'])
+            writer.writerow(['Amélie', '2001', '89', '8.0', '175'])
+            writer.writerow(['Line\nBreak, "Quoted"', '2002', '70', '7.0', '50'])
+
+        csv_data = CriticAggReader(str(csv_file)).read()
+        mmap_data = CriticAggReader(str(csv_file), mode='mmap').read()
+
+        assert mmap_data == csv_data
+        assert mmap_data[1].movie_title == 'Crouching Tiger, Hidden Dragon'
+        assert mmap_data[2].movie_title == 'Amélie'
+        assert mmap_data[3].movie_title == 'Line\nBreak, "Quoted"'
+
+        blank_file = tmp_path / "blank.csv"
+        blank_file.write_text("movie_title,release_year,critic_score_percentage,"
+                              "top_critic_score,total_critic_reviews_counted\n\n")
+
+        assert CriticAggReader(str(blank_file), mode='mmap').read() == \
+            CriticAggReader(str(blank_file)).read() == []
+
+        return
+
+    def test_mmap_mode_keeps_titles_undecoded(self, tmp_path) -> None:
+        csv_file = tmp_path / "critic.csv"
+        with open(csv_file, 'w', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(['movie_title', 'release_year', 'critic_score_percentage', 
+                           'top_critic_score', 'total_critic_reviews_counted'])
+            for number in range(5):
+                writer.writerow([f'Movie {number}', '2020', '85', '8.5', '100'])
+
+        reader = CriticAggReader(str(csv_file), mode='mmap')
+        batches = list(reader.read_batches(chunk_size=2))
+
+        assert [batch.length for batch in batches] == [2, 2, 1]
+        assert batches[0].column('movie_title') == [b'Movie 0', b'Movie 1']
+        assert batches[0].column('critic_score_pct') == [85, 85]
+        assert batches[0].materialize().column('movie_title') == \
+            ['Movie 0', 'Movie 1']
+
+        return
+
 
 class TestAudiencePulseReader:
     def test_read_json(self) -> None:
@@ -228,4 +299,17 @@ class TestBoxOfficeMetricsReader:
         assert movie_b.domestic_gross == 50000000
         assert movie_b.intl_gross is None
 
+        batches = list(reader.read_batches(chunk_size=2))
+        assert [batch.length for batch in batches] == [2, 1]
+        assert batches[1].column('film_name') == ['Movie C']
+        assert batches[1].column('prd_budget') == [30000000]
+
+        mmap_reader = BoxOfficeMetricsReader(
+            str(domestic_file),
+            str(international_file),
+            str(financials_file),
+            mode='mmap'
+        )
+        assert mmap_reader.read() == data
+
         return
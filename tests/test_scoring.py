@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from models import Movie
+from repository import MovieRepository
+from scoring import ScoreWeights, ScoringEngine
+
+
+def build_repository(count: int = 50) -> MovieRepository:
+    generator = random.Random(7)
+    repo = MovieRepository()
+
+    for number in range(count):
+        repo.add_update(Movie(
+            title=f"Movie {number}",
+            year=2000 + number % 5,
+            critic_score_pct=generator.randint(0, 100),
+            top_critic_score=round(generator.uniform(0, 10), 1),
+            total_critic_reviews=generator.randint(0, 500),
+            audience_avg_score=round(generator.uniform(0, 10), 1),
+            tot_audience_ratings=generator.randint(0, 100000)
+        ))
+
+    return repo
+
+
+class TestScoringEngine:
+    def test_more_ratings_weigh_more(self):
+        repo = MovieRepository()
+        repo.add_update(Movie(title="Few", year=2020, audience_avg_score=10.0,
+                              tot_audience_ratings=10))
+        repo.add_update(Movie(title="Many", year=2020, audience_avg_score=9.0,
+                              tot_audience_ratings=1000000))
+        repo.add_update(Movie(title="Bad", year=2020, audience_avg_score=2.0,
+                              tot_audience_ratings=1000000))
+
+        engine = ScoringEngine(repo, ScoreWeights(critic=0, top_critic=0,
+                                                  audience=1))
+
+        assert [movie.title for movie, _ in engine.top(3)] == \
+            ["Many", "Few", "Bad"]
+
+    def test_unrated_movie_is_not_scored(self):
+        repo = MovieRepository()
+        repo.add_update(Movie(title="Test", year=2020, prd_budget=100))
+
+        engine = ScoringEngine(repo)
+
+        assert engine.score("Test", 2020) is None
+        assert engine.top(10) == []
+
+    def test_percentiles(self):
+        engine = ScoringEngine(build_repository(5))
+
+        percentiles = sorted(engine.percentiles().values())
+
+        assert percentiles == [0.0, 25.0, 50.0, 75.0, 100.0]
+        best, _ = engine.top(1)[0]
+        assert engine.percentile(best.title, best.year) == 100.0
+
+    def test_top_per_year(self):
+        engine = ScoringEngine(build_repository())
+
+        top = engine.top(3, year=2001)
+
+        assert len(top) == 3
+        assert all(movie.year == 2001 for movie, _ in top)
+        assert [score for _, score in top] == \
+            sorted((score for _, score in top), reverse=True)
+
+    def test_refresh_only_scores_changed_movies(self):
+        repo = build_repository()
+        engine = ScoringEngine(repo)
+
+        repo.add_update(Movie(title="Movie 3", year=2003, critic_score_pct=100,
+                              top_critic_score=10.0, total_critic_reviews=5000,
+                              audience_avg_score=10.0,
+                              tot_audience_ratings=10 ** 7), 'critic', 10)
+        repo.add_update(Movie(title="New", year=2003, audience_avg_score=1.0,
+                              tot_audience_ratings=10 ** 7))
+
+        assert engine.refresh() == 2
+        assert engine.refresh() == 0
+
+        best, _ = engine.top(1, year=2003)[0]
+        assert best.title == "Movie 3"
+        worst, _ = engine.top(100, year=2003)[-1]
+        assert worst.title == "New"
+
+        ranked = [score for _, score in engine.top(100)]
+        assert len(ranked) == 51
+        assert ranked == sorted(ranked, reverse=True)
+        assert all(engine.score(movie.title, movie.year) == score
+                   for movie, score in engine.top(100))
+
+    def test_invalid_weights(self):
+        with pytest.raises(ValueError):
+            ScoreWeights(critic_prior_reviews=0)
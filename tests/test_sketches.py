@@ -0,0 +1,175 @@
+import json
+import random
+from unittest.mock import Mock
+
+import pytest
+
+from batch import RecordBatch
+from models import CriticData, Movie
+from pipeline import MovieDataPipeline
+from readers.base import DataReader
+from registry import load_pipeline_spec
+from repository import MovieRepository
+from sketches import CatalogStats, DDSketch, HyperLogLog
+
+
+class TestHyperLogLog:
+    def test_count_is_close(self):
+        sketch = HyperLogLog()
+        for number in range(20000):
+            sketch.add(f"movie {number}")
+
+        assert abs(sketch.count() - 20000) / 20000 < 0.05
+
+    def test_small_counts_and_duplicates(self):
+        sketch = HyperLogLog()
+        for _ in range(3):
+            for number in range(10):
+                sketch.add(f"movie {number}")
+
+        assert sketch.count() == 10
+
+    def test_merge_is_the_union(self):
+        left, right, both = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        for number in range(5000):
+            (left if number % 2 else right).add(str(number))
+            both.add(str(number))
+
+        left.merge(right)
+
+        assert left.registers == both.registers
+
+
+class TestDDSketch:
+    def test_quantiles_are_close(self):
+        generator = random.Random(1)
+        values = [generator.uniform(0, 10) for _ in range(50000)]
+        sketch = DDSketch()
+        for value in values:
+            sketch.add(value)
+
+        values.sort()
+        for q in (0, 0.5, 0.95, 1):
+            exact = values[int(q * (len(values) - 1))]
+            assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+
+        assert len(sketch.positive) < 1000
+
+    def test_removed_values_are_forgotten(self):
+        sketch = DDSketch()
+        for value in range(1, 101):
+            sketch.add(value)
+        for value in range(51, 101):
+            sketch.remove(value)
+        sketch.remove(1000)
+
+        assert sketch.count == 50
+        assert sketch.quantile(1) == pytest.approx(50, rel=0.01)
+
+    def test_zero_and_negative_values(self):
+        sketch = DDSketch()
+        for value in (-5, 0, 0, 3):
+            sketch.add(value)
+
+        assert sketch.quantile(0) == pytest.approx(-5, rel=0.01)
+        assert sketch.quantile(0.5) == 0
+        assert sketch.quantile(1) == pytest.approx(3, rel=0.01)
+
+    def test_merged_shards(self):
+        shards = [DDSketch() for _ in range(4)]
+        for value in range(40000):
+            shards[value % 4].add(value)
+
+        merged = DDSketch()
+        for shard in shards:
+            merged.merge(shard)
+
+        assert merged.count == 40000
+        assert merged.quantile(0.5) == pytest.approx(20000, rel=0.01)
+
+    def test_save_and_load(self):
+        sketch = DDSketch()
+        for value in (-2.5, 0, 7, 1e9):
+            sketch.add(value)
+
+        loaded = DDSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+
+        assert loaded.count == 4
+        assert [loaded.quantile(q) for q in (0, 1 / 3, 2 / 3, 1)] == \
+            [sketch.quantile(q) for q in (0, 1 / 3, 2 / 3, 1)]
+
+    def test_empty(self):
+        assert DDSketch().quantile(0.5) is None
+
+
+class TestCatalogStats:
+    def test_pipeline_updates_stats(self, tmp_path):
+        stats = CatalogStats()
+        pipeline = MovieDataPipeline(MovieRepository(), stats=stats)
+
+        reader = Mock(spec=DataReader)
+        reader.read.return_value = [
+            CriticData(f"Movie {number}", 2020 + number % 2, number, 8.0, 100)
+            for number in range(101)
+        ]
+        pipeline.process_critic_data(reader)
+
+        stats_file = str(tmp_path / "stats.json")
+        stats.save(stats_file)
+        loaded = CatalogStats.load(stats_file)
+
+        assert loaded.rows == 101
+        assert abs(loaded.distinct_titles() - 101) <= 2
+        assert abs(loaded.distinct_titles(2021) - 50) <= 1
+        assert loaded.quantile('critic_score_pct', 0.5) == \
+            pytest.approx(50, rel=0.01)
+        assert loaded.quantile('audience_avg_score', 0.5) is None
+
+    def test_merge_stats(self):
+        left, right = CatalogStats(), CatalogStats()
+        fields = {'title': 'title', 'year': 'year',
+                  'score': 'audience_avg_score'}
+
+        left.update_batch(RecordBatch({'title': ["A", "B"], 'year': [2020, 2020],
+                                       'score': [1.0, 2.0]}, 2), fields)
+        right.update_batch(RecordBatch({'title': ["B", "C"], 'year': [2020, 2021],
+                                        'score': [3.0, None]}, 2), fields)
+        left.add_movies([Movie(title="A", year=2020, audience_avg_score=1.0)])
+        right.add_movies([Movie(title="C", year=2021, audience_avg_score=3.0)])
+        left.merge(right)
+
+        assert left.distinct_titles() == 3
+        assert left.distinct_titles(2020) == 2
+        assert left.quantile('audience_avg_score', 1) == \
+            pytest.approx(3.0, rel=0.01)
+
+    def test_quantiles_count_each_movie_once(self):
+        spec = load_pipeline_spec()
+        registry = spec.registry()
+        stats = CatalogStats()
+        repository = MovieRepository(spec.merge_policy())
+        pipeline = MovieDataPipeline(repository, registry, stats=stats)
+
+        pipeline.run(registry.build_readers(spec.data_dir))
+        pipeline.run(registry.build_readers(spec.data_dir))
+
+        assert stats.quantiles['domestic_box_office'].count == repository.count()
+        assert stats.quantile('domestic_box_office', 0) == pytest.approx(min(
+            movie.domestic_box_office for movie in repository.search_all()),
+            rel=0.01)
+
+    def test_replaced_values_leave_the_quantiles(self):
+        stats = CatalogStats()
+        repository = MovieRepository()
+        MovieDataPipeline(repository, stats=stats)
+
+        repository.add_update(Movie(title="A", year=2020, critic_score_pct=40),
+                              'critic', 1)
+        repository.add_update(Movie(title="B", year=2020, critic_score_pct=60),
+                              'critic', 1)
+        repository.add_update(Movie(title="A", year=2020, critic_score_pct=90),
+                              'critic', 1)
+
+        assert stats.quantiles['critic_score_pct'].count == 2
+        assert stats.quantile('critic_score_pct', 0) == \
+            pytest.approx(60, rel=0.01)
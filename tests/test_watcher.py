@@ -0,0 +1,266 @@
+import json
+import os
+from pathlib import Path
+
+import main
+from pipeline import MovieDataPipeline
+from registry import load_pipeline_spec
+from repository import MovieRepository
+from watcher import DropDirectoryWatcher
+
+
+CRITIC_HEADER = ("movie_title,release_year,critic_score_percentage,"
+                 "top_critic_score,total_critic_reviews_counted\n")
+
+
+def build_watcher(drop_dir: Path, **options) -> DropDirectoryWatcher:
+    spec = load_pipeline_spec()
+    pipeline = MovieDataPipeline(MovieRepository(spec.merge_policy()),
+                                 spec.registry())
+
+    return DropDirectoryWatcher(pipeline, str(drop_dir), **options)
+
+
+class TestDropDirectoryWatcher:
+    def test_route_matches_watch_globs(self, tmp_path) -> None:
+        watcher = build_watcher(tmp_path)
+
+        assert watcher.route(Path("critic_aggregator_0001.csv")) == \
+            ('critic', 'file_path')
+        assert watcher.route(Path("box_office_metrics_financials.csv")) == \
+            ('box_office', 'financials_path')
+        assert watcher.route(Path("notes.txt")) is None
+
+        watcher.close()
+
+        return
+
+    def test_new_csv_file_is_ingested(self, tmp_path) -> None:
+        watcher = build_watcher(tmp_path)
+        (tmp_path / "critic_aggregator_1.csv").write_text(
+            CRITIC_HEADER + "Inception,2010,87,8.1,450\n")
+
+        assert len(watcher.poll()) == 1
+        report = watcher.flush()
+
+        assert report.files == 1
+        assert report.rows == 1
+        assert report.freshness_lag >= 0
+        movie = watcher.pipeline.repository.search("Inception", 2010)
+        assert movie.critic_score_pct == 87
+
+        watcher.close()
+
+        return
+
+    def test_only_appended_complete_lines_are_ingested(self, tmp_path) -> None:
+        watcher = build_watcher(tmp_path)
+        drop_file = tmp_path / "critic_aggregator.csv"
+        drop_file.write_text(CRITIC_HEADER + "Inception,2010,87,8.1,450\n")
+        watcher.poll()
+        watcher.flush()
+
+        with open(drop_file, 'a') as fp:
+            fp.write("Parasite,2019,99,9.2,400\nHalf Writ")
+        watcher.poll()
+        report = watcher.flush()
+
+        assert report.rows == 1
+        assert watcher.pipeline.repository.count() == 2
+
+        with open(drop_file, 'a') as fp:
+            fp.write("ten,2020,50,5.0,10\n")
+        watcher.poll()
+        report = watcher.flush()
+
+        assert report.rows == 1
+        assert watcher.pipeline.repository.search("Half Written", 2020) is not None
+        assert watcher.poll() == []
+
+        watcher.close()
+
+        return
+
+    def test_rows_written_between_poll_and_flush(self, tmp_path) -> None:
+        watcher = build_watcher(tmp_path)
+        drop_file = tmp_path / "critic_aggregator.csv"
+        drop_file.write_text(CRITIC_HEADER + "Inception,2010,87,8.1,450\n")
+        watcher.poll()
+
+        with open(drop_file, 'a') as fp:
+            fp.write("Parasite,2019,99,9.2,400\nB,2021,9")
+        report = watcher.flush()
+
+        assert report.rows == 1
+        assert report.failed == []
+        assert watcher.pipeline.repository.count() == 1
+
+        with open(drop_file, 'a') as fp:
+            fp.write(",8.0,10\n")
+        watcher.poll()
+        report = watcher.flush()
+
+        assert report.rows == 2
+        assert watcher.pipeline.repository.count() == 3
+
+        watcher.close()
+
+        return
+
+    def test_replaced_file_is_read_from_the_start(self, tmp_path) -> None:
+        watcher = build_watcher(tmp_path)
+        drop_file = tmp_path / "critic_aggregator.csv"
+        drop_file.write_text(CRITIC_HEADER + "Inception,2010,87,8.1,450\n")
+        watcher.poll()
+        watcher.flush()
+
+        new_file = tmp_path / "critic_aggregator.csv.tmp"
+        new_file.write_text(CRITIC_HEADER + "Parasite,2019,99,9.2,400\n"
+                            "Arrival,2016,94,8.5,380\n")
+        os.replace(new_file, drop_file)
+        watcher.poll()
+        report = watcher.flush()
+
+        assert report.rows == 2
+        assert report.failed == []
+        assert watcher.pipeline.repository.count() == 3
+
+        watcher.close()
+
+        return
+
+    def test_file_rewritten_in_place_is_read_from_the_start(self,
+                                                           tmp_path) -> None:
+        watcher = build_watcher(tmp_path)
+        drop_file = tmp_path / "critic_aggregator.csv"
+        drop_file.write_text(CRITIC_HEADER + "Inception,2010,87,8.1,450\n")
+        watcher.poll()
+        watcher.flush()
+
+        with open(drop_file, 'w') as fp:
+            fp.write(CRITIC_HEADER + "Parasite,2019,99,9.2,400\n"
+                     "Arrival,2016,94,8.5,380\n")
+        watcher.poll()
+        report = watcher.flush()
+
+        assert report.rows == 2
+        assert watcher.pipeline.repository.search("Arrival", 2016) is not None
+
+        watcher.close()
+
+        return
+
+    def test_broken_file_is_quarantined(self, tmp_path) -> None:
+        watcher = build_watcher(tmp_path)
+        (tmp_path / "critic_aggregator_1.csv").write_text(
+            "title,score\nInception,87\n")
+        (tmp_path / "critic_aggregator_2.csv").write_text(
+            CRITIC_HEADER + "Parasite,2019,99,9.2,400\n")
+
+        watcher.poll()
+        report = watcher.flush()
+
+        assert report.rows == 1
+        assert len(report.failed) == 1
+        quarantined = report.failed[0].path
+        assert quarantined.parent == tmp_path / "quarantine"
+        assert quarantined.name.endswith("critic_aggregator_1.csv")
+        assert report.failed[0].merged_rows == 0
+        assert watcher.pipeline.repository.search("Parasite", 2019) is not None
+        assert watcher.poll() == []
+
+        watcher.close()
+
+        return
+
+    def test_file_failing_late_merges_no_rows(self, tmp_path) -> None:
+        watcher = build_watcher(tmp_path)
+        watcher.pipeline.chunk_size = 1
+        (tmp_path / "critic_aggregator_1.csv").write_bytes(
+            CRITIC_HEADER.encode() + b"Good Movie,2020,80,7.0,100\n"
+            b"Bad \xff Movie,2020,60,6.0,90\n")
+
+        watcher.poll()
+        report = watcher.flush()
+
+        assert report.rows == 0
+        assert report.failed[0].merged_rows == 0
+        assert watcher.pipeline.repository.count() == 0
+
+        watcher.close()
+
+        return
+
+    def test_json_file_waits_until_stable(self, tmp_path) -> None:
+        watcher = build_watcher(tmp_path)
+        (tmp_path / "audience_pulse_1.json").write_text(json.dumps([{
+            "title": "Inception",
+            "year": "2010",
+            "audience_average_score": 9.1,
+            "total_audience_ratings": 1500000,
+            "domestic_box_office_gross": 292576195
+        }]))
+
+        assert watcher.poll() == []
+        assert len(watcher.poll()) == 1
+        assert watcher.poll() == []
+
+        watcher.flush()
+        movie = watcher.pipeline.repository.search("Inception", 2010)
+        assert movie.audience_avg_score == 9.1
+
+        watcher.close()
+
+        return
+
+    def test_single_box_office_feed(self, tmp_path) -> None:
+        watcher = build_watcher(tmp_path)
+        (tmp_path / "box_office_metrics_international_1.csv").write_text(
+            "film_name,year_of_release,box_office_gross_usd\n"
+            "Inception,2010,836800000\n")
+
+        watcher.poll()
+        watcher.flush()
+
+        movie = watcher.pipeline.repository.search("Inception", 2010)
+        assert movie.intl_box_office == 836800000
+        assert movie.domestic_box_office is None
+
+        watcher.close()
+
+        return
+
+    def test_batch_waits_for_max_latency(self, tmp_path) -> None:
+        watcher = build_watcher(tmp_path, max_latency=60, max_batch_files=2)
+        (tmp_path / "critic_aggregator_1.csv").write_text(
+            CRITIC_HEADER + "Inception,2010,87,8.1,450\n")
+        watcher.poll()
+
+        assert not watcher.should_flush()
+
+        (tmp_path / "critic_aggregator_2.csv").write_text(
+            CRITIC_HEADER + "Parasite,2019,99,9.2,400\n")
+        watcher.poll()
+
+        assert watcher.should_flush()
+
+        watcher.close()
+
+        return
+
+
+class TestWatchCommand:
+    def test_watch_once_saves_catalog(self, tmp_path, capsys) -> None:
+        catalog = str(tmp_path / "catalog.json")
+        drop_dir = tmp_path / "drop"
+        drop_dir.mkdir()
+        (drop_dir / "critic_aggregator.csv").write_text(
+            CRITIC_HEADER + "Inception,2010,87,8.1,450\n")
+
+        assert main.main(["--catalog", catalog, "watch",
+                          "--drop-dir", str(drop_dir), "--once"]) == 0
+
+        assert "Merged 1 rows from 1 files" in capsys.readouterr().out
+        assert MovieRepository.load(catalog).search("Inception", 2010) is not None
+
+        return
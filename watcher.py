@@ -0,0 +1,299 @@
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from pathlib import Path
+from threading import Event
+from typing import Callable, Dict, List, Optional, Tuple
+
+from batch import RecordBatch
+from pipeline import MovieDataPipeline
+from registry import ProviderSpec
+
+
+# Directory of the drop directory where files that fail to ingest are moved
+QUARANTINE_DIR = "quarantine"
+
+# Bytes kept from before the read position of a file, to check it is still
+# the file that was read
+TAIL_SIZE = 64
+
+
+@dataclass
+class FileState:
+    size: int
+    mtime: float
+    offset: int = 0
+    inode: int = 0
+    tail: bytes = b''
+
+
+@dataclass
+class Arrival:
+    # path is a snapshot of the rows taken at poll time in the spool
+    # directory, source the dropped file
+    provider: str
+    option: str
+    path: Path
+    source: Path
+    landed: float
+
+
+@dataclass
+class FailedArrival:
+    # path is where the file was moved in the quarantine directory,
+    # merged_rows the rows merged before the error
+    path: Path
+    error: str
+    merged_rows: int = 0
+
+
+@dataclass
+class BatchReport:
+    files: int
+    rows: int
+    duration: float
+    freshness_lag: float
+    failed: List[FailedArrival] = field(default_factory=list)
+
+
+class DropDirectoryWatcher:
+    def __init__(self, pipeline: MovieDataPipeline, drop_dir: str,
+                 poll_interval: float = 1.0, max_latency: float = 5.0,
+                 max_batch_files: int = 100,
+                 on_batch: Optional[Callable[[BatchReport], None]] = None):
+        # max_latency bounds how long an arrival waits for more files to
+        # join its micro-batch: 0 merges every poll, larger values merge
+        # fewer, bigger batches
+        self.pipeline = pipeline
+        self.drop_dir = Path(drop_dir)
+        self.poll_interval = poll_interval
+        self.max_latency = max_latency
+        self.max_batch_files = max_batch_files
+        self.on_batch = on_batch
+
+        self._files: Dict[Path, FileState] = {}
+        self._pending: List[Arrival] = []
+        self._pending_since: Optional[float] = None
+        self._spool_dir = Path(tempfile.mkdtemp(prefix="movie-watch-"))
+        self._wake = Event()
+
+        return
+
+    def route(self, path: Path) -> Optional[Tuple[str, str]]:
+        for provider in self.pipeline.registry.providers():
+            for option, pattern in provider.watch.items():
+                if fnmatch(path.name, pattern):
+                    return provider.name, option
+
+        return None
+
+    def poll(self) -> List[Arrival]:
+        arrivals = []
+
+        for path in sorted(self.drop_dir.iterdir()):
+            if not path.is_file():
+                continue
+
+            route = self.route(path)
+            if route is None:
+                continue
+
+            stat = path.stat()
+            state = self._files.get(path)
+            if state is not None and state.size == stat.st_size \
+                    and state.mtime == stat.st_mtime and state.offset >= 0:
+                continue
+
+            arrival = self._read_arrival(path, route, state, stat)
+            if arrival is not None:
+                arrivals.append(arrival)
+
+        if arrivals and self._pending_since is None:
+            self._pending_since = time.time()
+        self._pending.extend(arrivals)
+
+        return arrivals
+
+    def should_flush(self) -> bool:
+        if not self._pending:
+            return False
+
+        return len(self._pending) >= self.max_batch_files or \
+            time.time() - self._pending_since >= self.max_latency
+
+    def flush(self) -> Optional[BatchReport]:
+        if not self._pending:
+            return None
+
+        arrivals = self._pending
+        self._pending = []
+        self._pending_since = None
+
+        started = time.time()
+        rows = 0
+        failed = []
+        for arrival in arrivals:
+            # A broken file is moved to the quarantine directory, the rest of
+            # the micro-batch is still merged
+            merged = 0
+            try:
+                provider, batches = self._read(arrival)
+                drop_timestamp = self.pipeline.repository.next_timestamp()
+                for batch in batches:
+                    self.pipeline.process_batch(batch, provider, drop_timestamp)
+                    merged += batch.length
+            except Exception as error:
+                failed.append(FailedArrival(self._quarantine(arrival),
+                                            str(error), merged))
+                continue
+
+            rows += merged
+            arrival.path.unlink()
+
+        finished = time.time()
+        report = BatchReport(
+            files=len(arrivals),
+            rows=rows,
+            duration=finished - started,
+            freshness_lag=finished - min(arrival.landed for arrival in arrivals),
+            failed=failed
+        )
+
+        if self.on_batch is not None:
+            self.on_batch(report)
+
+        return report
+
+    def run(self, stop: Optional[Event] = None, once: bool = False) -> None:
+        stop = stop if stop is not None else Event()
+        observer = None if once else self._start_notifier()
+
+        try:
+            while not stop.is_set():
+                self.poll()
+
+                if once:
+                    # Second poll so whole-file formats count as settled
+                    self.poll()
+                    self.flush()
+                    break
+
+                if self.should_flush():
+                    self.flush()
+
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        finally:
+            if observer is not None:
+                observer.stop()
+            # Rows already taken from the drop directory are merged before
+            # stopping, they would not be read again
+            self.flush()
+            self.close()
+
+        return
+
+    def close(self) -> None:
+        shutil.rmtree(self._spool_dir, ignore_errors=True)
+
+        return
+
+    def _read(self, arrival: Arrival) -> Tuple[ProviderSpec, List[RecordBatch]]:
+        # The whole file is read and decoded before any of its rows is
+        # merged, so a file that cannot be read leaves the catalog untouched
+        provider = self.pipeline.registry.get(arrival.provider)
+        reader = provider.build_file_reader(arrival.option, arrival.path)
+
+        return provider, [batch.materialize() for batch
+                          in self.pipeline.read_batches(provider, reader)]
+
+    def _quarantine(self, arrival: Arrival) -> Path:
+        quarantine_dir = self.drop_dir / QUARANTINE_DIR
+        quarantine_dir.mkdir(exist_ok=True)
+        target = quarantine_dir / arrival.path.name
+        shutil.move(str(arrival.path), str(target))
+
+        return target
+
+    def _read_arrival(self, path: Path, route: Tuple[str, str],
+                      state: Optional[FileState], stat) -> Optional[Arrival]:
+        provider, option = route
+
+        if path.suffix != '.csv':
+            # Whole-file formats are read again once they are unchanged for
+            # a poll, offset -1 marks a file waiting to settle
+            if state is None or state.offset >= 0 \
+                    or state.size != stat.st_size or state.mtime != stat.st_mtime:
+                self._files[path] = FileState(stat.st_size, stat.st_mtime, -1)
+                return None
+
+            state.offset = stat.st_size
+
+            return self._spool(provider, option, path, path.read_bytes(),
+                               stat.st_mtime)
+
+        with open(path, 'rb') as fp:
+            header = fp.readline()
+            start = max(len(header), self._resume_offset(fp, state, stat))
+            fp.seek(start)
+            appended = fp.read(stat.st_size - start)
+
+            # Only complete lines are taken, a half written line waits
+            # for the next poll
+            complete = appended[:appended.rfind(b'\n') + 1]
+            offset = start + len(complete)
+            fp.seek(max(0, offset - TAIL_SIZE))
+            tail = fp.read(offset - fp.tell())
+
+        self._files[path] = FileState(stat.st_size, stat.st_mtime, offset,
+                                      stat.st_ino, tail)
+        if not complete:
+            return None
+
+        return self._spool(provider, option, path, header + complete,
+                           stat.st_mtime)
+
+    def _resume_offset(self, fp, state: Optional[FileState], stat) -> int:
+        # The read position is only kept for the same file: a file replaced
+        # under the same name, or rewritten, is read from the start
+        if state is None or state.inode != stat.st_ino \
+                or not 0 < state.offset <= stat.st_size:
+            return 0
+
+        fp.seek(state.offset - len(state.tail))
+        if fp.read(len(state.tail)) != state.tail:
+            return 0
+
+        return state.offset
+
+    def _spool(self, provider: str, option: str, source: Path, content: bytes,
+               landed: float) -> Arrival:
+        # The rows are copied at poll time, so writes to the dropped file
+        # before the flush are left for the next poll
+        spool_file = self._spool_dir / f"{time.time_ns()}-{source.name}"
+        spool_file.write_bytes(content)
+
+        return Arrival(provider, option, spool_file, source, landed)
+
+    def _start_notifier(self):
+        # An OS notifier only wakes the loop up early, the directory is
+        # always scanned by poll()
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+
+        wake = self._wake
+
+        class WakeHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+
+        observer = Observer()
+        observer.schedule(WakeHandler(), str(self.drop_dir))
+        observer.start()
+
+        return observer